@@ -0,0 +1,235 @@
+#===================================================================
+# MICRO-BENCHMARKS
+#===================================================================
+# Usage:
+#   python ./benchmark.py                                   # 1k..1M, writes bench_baseline.json
+#   python ./benchmark.py --sizes 1000,10000 --formats csv
+#   python ./benchmark.py --compare bench_baseline.json     # diff against a saved run
+#
+# Runs inside a throwaway working directory so the real db.json,
+# temp/ and static/upload are never touched. Each stage is timed without
+# tracemalloc, peak memory comes from a second, traced run. Any failure
+# stops the run, nothing is written.
+#===================================================================
+from generate_data import generateText, generateTable
+from tinydb import Query
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import datetime
+import shutil
+import copy
+import json
+import time
+import sys
+import os
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PARTNER = "Bench"
+DETECTION = [
+    "PERSON", "IC_NUMBER", "US_PASSPORT", "EMAIL_ADDRESS",
+    "LOCATION", "PHONE_NUMBER"
+]
+
+#===================================================================
+# UNITS
+#==================================================================
+
+def measure(prepare, fn):
+    # tracemalloc slows allocation heavy code down, so time an untraced run
+    # and take peak memory from a second one. prepare() resets the inputs
+    args = prepare()
+    start = time.perf_counter()
+    fn(*args)
+    seconds = time.perf_counter() - start
+
+    args = prepare()
+    tracemalloc.start()
+    try:
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+def record(results, stage, fmt, rows, seconds, peak):
+    entry = {
+        "stage": stage,
+        "format": fmt,
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(rows / seconds, 1) if seconds else None,
+        "peak_mb": round(peak / (1024 * 1024), 2),
+    }
+    results.append(entry)
+    print(f"{stage:<18}{fmt:<6}{rows:>9}  {entry['seconds']:>9.3f}s  "
+          f"{entry['rows_per_sec'] or 0:>11.1f} rows/s  {entry['peak_mb']:>8.2f} MB")
+
+def maxLength(run):
+    # spaCy refuses longer texts (E088)
+    return run.analyzer.nlp_engine.nlp["en"].max_length
+
+def fileRecord(run, filename):
+    Partner = Query()
+    partner = run.db.get(Partner.partner == PARTNER)
+    file = next(f for f in partner["files"] if f["filename"] == filename)
+    return {"partner": partner, "file": file}
+
+def dropFile(run, filename):
+    # process appends a file record, a second run must not add another
+    Partner = Query()
+    partner = run.db.get(Partner.partner == PARTNER)
+    files = [f for f in partner["files"] if f["filename"] != filename]
+    run.db.update({"files": files}, Partner.partner == PARTNER)
+
+def restore(run, snapshot, filename):
+    # Toggles rewrite the output in place, put back the state they start from
+    def prepare():
+        data = fileRecord(run, filename)
+        shutil.copyfile(snapshot, data["file"]["download"])
+        return (data,)
+    return prepare
+
+def snapshot(run, filename, name):
+    path = os.path.join("source", f"{name}_{filename}")
+    shutil.copyfile(fileRecord(run, filename)["file"]["download"], path)
+    return path
+
+#===================================================================
+# Benchmarks
+#==================================================================
+
+def benchText(run, rows, results):
+    filename = f"bench_{rows}.txt"
+    review = []
+    source = generateText(rows, os.path.join("source", filename), review=review)
+    path = os.path.join("temp", filename)
+
+    # analyzeTxt hands the whole file to spaCy, longer texts are skipped
+    chars = os.path.getsize(source)
+    if chars > maxLength(run):
+        print(f"{'(skipped)':<18}{'txt':<6}{rows:>9}  analyzeTxt: {chars} chars is over spaCy max_length {maxLength(run)}")
+    else:
+        def analyzeArgs():
+            shutil.copyfile(source, path)
+            return ({"partner": PARTNER, "filename": filename, "type": "Text File", "review": []},)
+
+        record(results, "analyzeTxt", "txt", rows, *measure(analyzeArgs, run.analyzeTxt))
+
+    # processTxt doesn't need spaCy, it gets the generator's own spans at every size
+    job = {"partner": PARTNER, "filename": filename, "type": "Text File", "review": review}
+
+    def processArgs():
+        shutil.copyfile(source, path)
+        dropFile(run, filename)
+        return (copy.deepcopy(job),)
+
+    record(results, "processTxt", "txt", rows, *measure(processArgs, run.processTxt))
+
+def benchTable(run, rows, fmt, results):
+    filename = f"bench_{rows}.{fmt}"
+    source = generateTable(rows, os.path.join("source", filename))
+    path = os.path.join("temp", filename)
+    job = {"partner": PARTNER, "filename": filename, "type": "Tabular File", "review": []}
+
+    def analyzeArgs():
+        shutil.copyfile(source, path)
+        job["review"] = []
+        return (job,)
+
+    def processArgs():
+        shutil.copyfile(source, path)
+        dropFile(run, filename)
+        return (copy.deepcopy(job),)
+
+    record(results, "analyzeTable", fmt, rows, *measure(analyzeArgs, run.analyzeTable))
+    record(results, "processTable", fmt, rows, *measure(processArgs, run.processTable))
+
+    anonymized = snapshot(run, filename, "anonymized")
+    record(results, "deanonymizeTable", fmt, rows,
+           *measure(restore(run, anonymized, filename), run.deanonymizeTable))
+
+    deanonymized = snapshot(run, filename, "deanonymized")
+    record(results, "anonymizeTable", fmt, rows,
+           *measure(restore(run, deanonymized, filename), run.anonymizeTable))
+
+def compare(results, path):
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = {
+            (r["stage"], r["format"], r["rows"]): r
+            for r in json.load(f)["results"]
+        }
+
+    print("\n=========Compare with", path, "=========")
+    for r in results:
+        old = baseline.get((r["stage"], r["format"], r["rows"]))
+        if not old or not old.get("rows_per_sec") or not r.get("rows_per_sec"):
+            continue
+        speedup = r["rows_per_sec"] / old["rows_per_sec"]
+        memory = r["peak_mb"] / old["peak_mb"] if old["peak_mb"] else 0
+        print(f"{r['stage']:<18}{r['format']:<6}{r['rows']:>9}  "
+              f"throughput x{speedup:.2f}  peak memory x{memory:.2f}")
+
+#=================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark analyze/process/toggle functions")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000",
+                        help="comma separated rows/lines per run")
+    parser.add_argument("--formats", default="txt,csv,xlsx",
+                        help="comma separated: txt, csv, xlsx")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="benchmark the deterministic tokenization mode")
+    parser.add_argument("--out", default=os.path.join(BACKEND_DIR, "bench_baseline.json"))
+    parser.add_argument("--compare", help="baseline json to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    formats = [f for f in args.formats.split(",") if f]
+    out = os.path.abspath(args.out)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    # run.py uses relative paths, so import it from inside the workspace
+    workdir = tempfile.mkdtemp(prefix="dpp_bench_")
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    import run
+    os.makedirs("source", exist_ok=True)
+
+    run.db.insert({
+        "partner": PARTNER,
+        "key": "benchmark-key",
+        "password": "benchmark",
+        "detection": DETECTION,
+        "icon": "",
+        "deterministic": args.deterministic,
+        "files": []
+    })
+
+    results = []
+    try:
+        for rows in sizes:
+            for fmt in formats:
+                if fmt == "txt":
+                    benchText(run, rows, results)
+                else:
+                    benchTable(run, rows, fmt, results)
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "deterministic": args.deterministic,
+        "results": results
+    }
+    # Compare first, --out may point at the baseline being compared
+    if baseline:
+        compare(results, baseline)
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print("\nSaved:", out)
@@ -0,0 +1,151 @@
+#===================================================================
+# SYNTHETIC MALAYSIAN PII DATA GENERATOR
+#===================================================================
+# Usage:
+#   python ./generate_data.py --rows 10000 --format csv --out temp/users.csv
+#   python ./generate_data.py --rows 5000 --format txt --out temp/users.txt
+#
+# Values are shaped to match the recognizers in run.py
+# (IC number, Malaysia phone, passport, Malaysia address)
+#===================================================================
+import pandas as pd
+import argparse
+import random
+import os
+
+FIRST_NAMES = [
+    "Ahmad", "Siti", "Muhammad", "Nur", "Wei Ling", "Kok Wai", "Mei Ling",
+    "Rajesh", "Priya", "Arjun", "Aisyah", "Hafiz", "Jia Hui", "Kumar",
+    "Farah", "Zul", "Chee Keong", "Lakshmi", "Amirul", "Yee Ting"
+]
+LAST_NAMES = [
+    "Abdullah", "Ismail", "Tan", "Lim", "Wong", "Lee", "Ng", "Chong",
+    "Subramaniam", "Krishnan", "Rahman", "Hassan", "Yusof", "Goh", "Ong"
+]
+STREETS = [
+    "Jalan Tun Razak", "Jalan Ampang", "Jalan Gurney", "Lorong Maarof",
+    "Jalan Sultan Ismail", "Persiaran Gurney", "Jalan Bukit Bintang",
+    "Lebuh Chulia", "Jalan Tebrau", "Jalan Kuching"
+]
+AREAS = ["Taman Melawati", "Taman Desa", "Bandar Baru", "Seksyen 7", "Kampung Baru"]
+CITIES = [
+    ("Shah Alam", "Selangor", "40000"), ("Ipoh", "Perak", "30000"),
+    ("Johor Bahru", "Johor", "80000"), ("George Town", "Penang", "10200"),
+    ("Kuala Lumpur", "Kuala Lumpur", "50450"), ("Kuching", "Sarawak", "93000"),
+    ("Kota Kinabalu", "Sabah", "88000"), ("Seremban", "Negeri Sembilan", "70000"),
+    ("Kuantan", "Pahang", "25000"), ("Alor Setar", "Kedah", "05000")
+]
+DOMAINS = ["gmail.com", "yahoo.com", "hotmail.com", "example.com.my"]
+STATUSES = ["Pending", "Approved", "Rejected"]
+
+COLUMNS = [
+    "No", "Full Name", "National ID", "Email Address", "Phone Number",
+    "Passport Number", "Home Address", "Loan Status", "Remarks"
+]
+
+#===================================================================
+# UNITS
+#==================================================================
+
+def ic_number(rng):
+    return (f"{rng.randint(50, 99):02d}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"
+            f"-{rng.randint(1, 16):02d}-{rng.randint(0, 9999):04d}")
+
+def phone(rng):
+    prefix = rng.choice(["+60", "0"])
+    return f"{prefix}1{rng.randint(0, 9)}-{rng.randint(1000000, 9999999)}"
+
+def passport(rng):
+    return f"{rng.choice('AHK')}{rng.randint(10000000, 99999999)}"
+
+def address(rng):
+    city, state, postcode = rng.choice(CITIES)
+    return f"No {rng.randint(1, 999)}, {rng.choice(STREETS)}, {rng.choice(AREAS)}, {postcode} {city}, {state}"
+
+def person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+def email(rng, name):
+    return f"{name.lower().replace(' ', '.')}{rng.randint(1, 999)}@{rng.choice(DOMAINS)}"
+
+def record(rng, no):
+    name = person(rng)
+    ic = ic_number(rng)
+    hp = phone(rng)
+    return {
+        "No": no,
+        "Full Name": name,
+        "National ID": ic,
+        "Email Address": email(rng, name),
+        "Phone Number": hp,
+        "Passport Number": passport(rng),
+        "Home Address": address(rng),
+        "Loan Status": rng.choice(STATUSES),
+        "Remarks": f"Customer called from {hp} to update IC {ic}."
+    }
+
+#===================================================================
+# Generators
+#==================================================================
+
+def textLine(r):
+    # (text, entity) pieces of one line, entity None between values
+    return [
+        (r["Full Name"], "PERSON"), (" (IC: ", None),
+        (r["National ID"], "IC_NUMBER"), (", passport ", None),
+        (r["Passport Number"], "US_PASSPORT"), (") lives at ", None),
+        (r["Home Address"], "LOCATION"), (". Contact ", None),
+        (r["Phone Number"], "PHONE_NUMBER"), (" or ", None),
+        (r["Email Address"], "EMAIL_ADDRESS"), (".\n", None)
+    ]
+
+def generateText(lines, path, seed=0, review=None):
+    # review: list to fill with every generated value, shaped like the
+    # review analyzeTxt builds (so processTxt can run without spaCy)
+    rng = random.Random(seed)
+    offset = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1, lines + 1):
+            for text, entity in textLine(record(rng, i)):
+                if entity and review is not None:
+                    review.append({
+                        "detect": entity,
+                        "start": offset,
+                        "end": offset + len(text),
+                        "confidence": 100,
+                        "word": text,
+                        "ignore": False
+                    })
+                f.write(text)
+                offset += len(text)
+    return path
+
+def generateTable(rows, path, seed=0):
+    rng = random.Random(seed)
+    df = pd.DataFrame([record(rng, i) for i in range(1, rows + 1)], columns=COLUMNS)
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext in {".xls", ".xlsx"}:
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+#=================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic Malaysian PII data")
+    parser.add_argument("--rows", type=int, default=1000, help="rows (table) or lines (text)")
+    parser.add_argument("--format", choices=["txt", "csv", "xlsx"], default="csv")
+    parser.add_argument("--out", help="output path, default temp/synthetic_<rows>.<format>")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    out = args.out or os.path.join("temp", f"synthetic_{args.rows}.{args.format}")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+
+    if args.format == "txt":
+        generateText(args.rows, out, args.seed)
+    else:
+        generateTable(args.rows, out, args.seed)
+    print("Generated:", out)
@@ -0,0 +1,301 @@
+#===================================================================
+# LOCAL HTTP LOAD TEST
+#===================================================================
+# Usage:
+#   python ./loadtest.py --users 8 --iterations 5 --partners 3
+#   python ./loadtest.py --mix txt:1000,csv:5000,xlsx:1000 --out load.json
+#   python ./loadtest.py --same-names     # every user uploads the same filename
+#
+# Starts run.py as its own process on a local port inside a throwaway
+# working directory, then drives it with concurrent virtual users. Upload
+# files are written before the timed phase. Each user runs
+#   /upload -> /process -> /deanonymize -> /anonymize -> /download
+# and checks afterwards that its file landed under the right partner.
+# Every upload also carries a marker line/row naming its user and
+# iteration, and the downloaded archive must contain that marker, so
+# mix-ups from shared state (globalHolder, temp/ filenames) are
+# reported separately from plain HTTP errors, also with --same-names.
+#===================================================================
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, defaultdict
+from generate_data import generateText, generateTable
+import pandas as pd
+import threading
+import pyzipper
+import argparse
+import tempfile
+import requests
+import subprocess
+import random
+import shutil
+import json
+import time
+import sys
+import io
+import os
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DETECTION = [
+    "PERSON", "IC_NUMBER", "US_PASSPORT", "EMAIL_ADDRESS",
+    "LOCATION", "PHONE_NUMBER"
+]
+# 1x1 PNG for partner icons, /create only checks the extension
+ICON = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000100e221bc330000000049454e44ae426082"
+)
+STARTUP_TIMEOUT = 300
+
+#===================================================================
+# UNITS
+#==================================================================
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    def add(self, endpoint, seconds, error=None):
+        with self.lock:
+            self.latency[endpoint].append(seconds)
+            if error:
+                self.errors[endpoint][error] += 1
+
+    def flag(self, endpoint, error):
+        # Error found by a follow-up check, not a timed request
+        with self.lock:
+            self.errors[endpoint][error] += 1
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, int(round(p / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+def call(stats, endpoint, method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = requests.request(method, url, timeout=600, **kwargs)
+        error = None if response.status_code == 200 else f"http_{response.status_code}"
+    except requests.RequestException as e:
+        response = None
+        error = type(e).__name__
+    stats.add(endpoint, time.perf_counter() - start, error)
+    return response if error is None else None
+
+def prepareFiles(mix, folder):
+    # One file per (type, rows) pair, reused by every upload
+    files = []
+    for ext, rows in mix:
+        path = os.path.join(folder, f"sample_{rows}.{ext}")
+        if ext == "txt":
+            generateText(rows, path)
+        else:
+            generateTable(rows, path)
+        files.append(path)
+    return files
+
+def markFile(source, path, marker):
+    # Copy of source plus one marker line (text) or row (table, in "No")
+    ext = os.path.splitext(source)[1].lower()
+    if ext == ".txt":
+        shutil.copyfile(source, path)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(marker + "\n")
+        return path
+
+    df = pd.read_excel(source) if ext in {".xls", ".xlsx"} else pd.read_csv(source)
+    df = pd.concat([df, pd.DataFrame([{"No": marker}])], ignore_index=True)
+    if ext in {".xls", ".xlsx"}:
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+def hasMarker(archive, password, filename, marker):
+    # The marker is never PII, so it survives processing and the toggles
+    with pyzipper.AESZipFile(io.BytesIO(archive)) as zf:
+        zf.setpassword(password.encode())
+        if filename not in zf.namelist():
+            return False
+        content = zf.read(filename)
+    if os.path.splitext(filename)[1].lower() in {".xls", ".xlsx"}:
+        return bool((pd.read_excel(io.BytesIO(content)).astype(str) == marker).any().any())
+    return marker.encode() in content
+
+def startServer(workdir, port):
+    # Own process, so the server doesn't share the GIL with the clients
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG="0")
+    logPath = os.path.join(workdir, "server.log")
+    with open(logPath, "w", encoding="utf-8") as log:
+        server = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, "run.py")],
+                                  cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            break
+        try:
+            requests.get(f"{base}/partners", timeout=5)
+            return server, base
+        except requests.RequestException:
+            time.sleep(0.5)
+    stopServer(server)
+    with open(logPath, encoding="utf-8") as f:
+        raise RuntimeError("run.py did not start:\n" + f.read()[-2000:])
+
+def stopServer(server):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+#===================================================================
+# Virtual user
+#==================================================================
+
+def plan(partners, files, folder, user, iteration, same_names):
+    # Everything a session needs, marked upload file included
+    rng = random.Random(user * 1000 + iteration)
+    partner, password = rng.choice(partners)
+    source = rng.choice(files)
+    ext = os.path.splitext(source)[1]
+    marker = f"LOADMARK-{user}-{iteration}"
+    return {
+        "partner": partner,
+        "password": password,
+        "filename": f"load{ext}" if same_names else f"load_u{user}_i{iteration}{ext}",
+        "marker": marker,
+        "upload": markFile(source, os.path.join(folder, f"u{user}_i{iteration}{ext}"), marker)
+    }
+
+def session(base, stats, work):
+    partner, password = work["partner"], work["password"]
+    filename, marker, upload = work["filename"], work["marker"], work["upload"]
+
+    #1) Upload + analyze
+    with open(upload, "rb") as f:
+        response = call(stats, "/upload", "POST", f"{base}/upload",
+                        params={"partner": partner}, data={"partner": partner},
+                        files={"file": (filename, f)})
+    if response is None:
+        return
+    job = response.json()
+    if job.get("partner") != partner or job.get("filename") != filename:
+        stats.flag("/upload", "state_mismatch")
+
+    #2) Process with the review we got back
+    if call(stats, "/process", "POST", f"{base}/process", json=job["review"]) is None:
+        return
+
+    # Whatever globalHolder held is what got processed, check it was ours
+    response = requests.get(f"{base}/partners/{partner}", timeout=60)
+    names = [f["filename"] for f in response.json().get("files", [])] if response.ok else []
+    if filename not in names:
+        stats.flag("/process", "state_mismatch")
+        return
+
+    #3) Toggle both ways
+    meta = {"partner": partner, "filename": filename}
+    call(stats, "/deanonymize", "POST", f"{base}/deanonymize", data=meta)
+    call(stats, "/anonymize", "POST", f"{base}/anonymize", data=meta)
+
+    #4) Download the partner archive, our file must still hold our content
+    response = call(stats, "/download", "POST", f"{base}/download", data={"partner": partner})
+    if response is not None and not hasMarker(response.content, password, filename, marker):
+        stats.flag("/download", "content_mismatch")
+
+#===================================================================
+# Report
+#==================================================================
+
+def report(stats, elapsed):
+    summary = {}
+    print(f"\n{'endpoint':<14}{'count':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}  errors")
+    for endpoint in set(stats.latency) | set(stats.errors):
+        values = stats.latency[endpoint]
+        errors = dict(stats.errors[endpoint])
+        summary[endpoint] = {
+            "count": len(values),
+            "rps": round(len(values) / elapsed, 2),
+            "p50": round(percentile(values, 50), 4),
+            "p95": round(percentile(values, 95), 4),
+            "p99": round(percentile(values, 99), 4),
+            "errors": errors
+        }
+        s = summary[endpoint]
+        print(f"{endpoint:<14}{s['count']:>7}{s['rps']:>9.2f}{s['p50']:>8.3f}s{s['p95']:>8.3f}s"
+              f"{s['p99']:>8.3f}s  {errors or ''}")
+
+    if any("state_mismatch" in stats.errors[e] for e in stats.errors):
+        print("\n!! state_mismatch: a request saw another user's job (shared globalHolder / temp files)")
+    if any("content_mismatch" in stats.errors[e] for e in stats.errors):
+        print("\n!! content_mismatch: a downloaded file held another user's content (shared output files)")
+    return summary
+
+#=================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test for the Flask endpoints")
+    parser.add_argument("--users", type=int, default=4, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=3, help="sessions per user")
+    parser.add_argument("--partners", type=int, default=2)
+    parser.add_argument("--mix", default="txt:200,csv:1000,xlsx:500",
+                        help="comma separated <type>:<rows> files to pick from")
+    parser.add_argument("--same-names", action="store_true",
+                        help="all users upload the same filename (storage contention)")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--out", help="write the summary as json")
+    args = parser.parse_args()
+
+    mix = [(t, int(n)) for t, n in (m.split(":") for m in args.mix.split(",") if m)]
+    out = os.path.abspath(args.out) if args.out else None
+
+    # run.py uses relative paths, so it runs inside the workspace
+    workdir = tempfile.mkdtemp(prefix="dpp_load_")
+    server, base = startServer(workdir, args.port)
+
+    try:
+        partners = []
+        for i in range(args.partners):
+            name, password = f"Load{i}", f"pass{i}"
+            requests.post(f"{base}/create",
+                          data={"partner": name, "key": f"key{i}", "password": password,
+                                "detection": DETECTION},
+                          files={"icon": ("icon.png", ICON)}, timeout=60).raise_for_status()
+            partners.append((name, password))
+
+        files = prepareFiles(mix, workdir)
+        works = [
+            plan(partners, files, workdir, user, it, args.same_names)
+            for user in range(args.users)
+            for it in range(args.iterations)
+        ]
+        stats = Stats()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            jobs = [pool.submit(session, base, stats, work) for work in works]
+            for job in jobs:
+                try:
+                    job.result()
+                except Exception as e:
+                    stats.flag("session", type(e).__name__)
+        elapsed = time.perf_counter() - start
+
+        summary = report(stats, elapsed)
+        print(f"\n{args.users} users x {args.iterations} sessions in {elapsed:.2f}s")
+    finally:
+        stopServer(server)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump({"users": args.users, "iterations": args.iterations,
+                       "partners": args.partners, "mix": args.mix,
+                       "elapsed": round(elapsed, 2), "endpoints": summary}, f, indent=2)
+        print("Saved:", out)
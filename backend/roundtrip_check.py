@@ -0,0 +1,141 @@
+#===================================================================
+# ROUND-TRIP CHECK
+#===================================================================
+# Usage:
+#   python ./roundtrip_check.py
+#   python ./roundtrip_check.py --rows 500 --formats csv,xlsx
+#
+# For every format, in random (encrypt) and deterministic (vault) mode:
+#   analyze -> process -> deanonymize -> anonymize -> deanonymize
+# Restored files must equal their source, anonymized ones must differ
+# (and in deterministic mode equal the first processed output). Tables
+# must include a free-text column, so span encryption is covered too.
+# Runs inside a throwaway working directory, exits 1 on any failure.
+#===================================================================
+from generate_data import generateText, generateTable
+from tinydb import Query
+import argparse
+import tempfile
+import shutil
+import copy
+import sys
+import os
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PARTNERS = {"RoundTrip": False, "RoundTripDet": True}
+DETECTION = [
+    "PERSON", "IC_NUMBER", "US_PASSPORT", "EMAIL_ADDRESS",
+    "LOCATION", "PHONE_NUMBER"
+]
+
+#===================================================================
+# UNITS
+#==================================================================
+
+def fileRecord(run, partner, filename):
+    Partner = Query()
+    record = run.db.get(Partner.partner == partner)
+    file = next(f for f in record["files"] if f["filename"] == filename)
+    return {"partner": record, "file": file}
+
+def same(run, a, b):
+    if os.path.splitext(a)[1].lower() == ".txt":
+        return run.readText(a) == run.readText(b)
+    return run.loadTable(a).astype(str).equals(run.loadTable(b).astype(str))
+
+def check(failures, name, step, ok):
+    print(f"{name:<32}{step:<20}{'ok' if ok else 'FAIL'}")
+    if not ok:
+        failures.append(f"{name}: {step}")
+
+#===================================================================
+# Round trip
+#==================================================================
+
+def roundTrip(run, partner, fmt, rows, failures):
+    filename = f"{partner}_{rows}.{fmt}"
+    source = os.path.join("source", filename)
+    if fmt == "txt":
+        generateText(rows, source)
+    else:
+        generateTable(rows, source)
+    shutil.copyfile(source, os.path.join("temp", filename))
+
+    text = fmt == "txt"
+    job = {
+        "partner": partner,
+        "filename": filename,
+        "type": "Text File" if text else "Tabular File",
+        "review": []
+    }
+    if text:
+        run.analyzeTxt(job)
+        run.processTxt(copy.deepcopy(job))
+    else:
+        run.analyzeTable(job)
+        freetext = [e["column"] for e in job["review"] if e.get("mode") == "freetext"]
+        check(failures, filename, "freetext column", bool(freetext))
+        run.processTable(copy.deepcopy(job))
+
+    deanonymize = run.deanonymizeTxt if text else run.deanonymizeTable
+    anonymize = run.anonymizeTxt if text else run.anonymizeTable
+    out = fileRecord(run, partner, filename)["file"]["download"]
+    processed = shutil.copyfile(out, os.path.join("source", "processed_" + filename))
+
+    check(failures, filename, "process", not same(run, out, source))
+
+    deanonymize(fileRecord(run, partner, filename))
+    check(failures, filename, "deanonymize", same(run, out, source))
+
+    anonymize(fileRecord(run, partner, filename))
+    check(failures, filename, "anonymize", not same(run, out, source))
+    if PARTNERS[partner]:
+        check(failures, filename, "stable tokens", same(run, out, processed))
+
+    deanonymize(fileRecord(run, partner, filename))
+    check(failures, filename, "deanonymize again", same(run, out, source))
+
+#=================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that processed files toggle back to their source")
+    parser.add_argument("--rows", type=int, default=200, help="rows (table) or lines (text)")
+    parser.add_argument("--formats", default="txt,csv,xlsx",
+                        help="comma separated: txt, csv, xlsx")
+    args = parser.parse_args()
+
+    formats = [f for f in args.formats.split(",") if f]
+
+    # run.py uses relative paths, so import it from inside the workspace
+    workdir = tempfile.mkdtemp(prefix="dpp_roundtrip_")
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    import run
+    os.makedirs("source", exist_ok=True)
+
+    for partner, deterministic in PARTNERS.items():
+        run.db.insert({
+            "partner": partner,
+            "key": f"{partner}-key",
+            "password": f"{partner}-password",
+            "detection": DETECTION,
+            "icon": "",
+            "deterministic": deterministic,
+            "files": []
+        })
+
+    failures = []
+    try:
+        for partner in PARTNERS:
+            for fmt in formats:
+                roundTrip(run, partner, fmt, args.rows, failures)
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print(f"\n{len(failures)} check(s) failed:")
+        for failure in failures:
+            print(" -", failure)
+        sys.exit(1)
+    print("\nAll round trips restored their source")
@@ -6,12 +6,15 @@ from presidio_analyzer import (
     PatternRecognizer,
     RecognizerRegistry,
     AnalyzerEngine,
+    BatchAnalyzerEngine,
 )
 from flask import (
     Flask, 
     request, 
     jsonify,
-    send_file
+    send_file,
+    g,
+    has_request_context
 )
 from presidio_anonymizer.entities import (
     RecognizerResult,
@@ -19,20 +22,36 @@ from presidio_anonymizer.entities import (
     OperatorConfig
 )
 from presidio_anonymizer import AnonymizerEngine, DeanonymizeEngine
-from collections import Counter, defaultdict
+from presidio_anonymizer.operators import AESCipher
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from tinydb import TinyDB, Query
+from tinydb.table import Document
 from flask import Flask
 from flask_cors import CORS
 import hashlib
+import hmac
 import pandas as pd
 import numpy as np
 import msoffcrypto
 import pyzipper
 import pprint
+import tracemalloc
+import multiprocessing
+import threading
+import time
+import math
+import uuid
 import os
 import io
 import copy
+import json
+import shutil
+import zlib
 
 #==================================================================
 # TUNING PII ANALYZER
@@ -130,6 +149,7 @@ analyzer.registry.add_recognizer(MalaysiaPhoneRecognizer())
 analyzer.registry.add_recognizer(GenericPassportRecognizer())
 analyzer.registry.add_recognizer(MalaysianICRecognizer())
 analyzer.registry.recognizers.insert(0, MalaysiaAddressRecognizer())
+batchAnalyzer = BatchAnalyzerEngine(analyzer_engine=analyzer)
 anonymizer = AnonymizerEngine()
 denonymizer = DeanonymizeEngine()
 
@@ -146,44 +166,667 @@ def normalize_values(values):
         return [float(v) for v in values]
     return values
 
+def db_etag():
+    # TinyDB rewrites db.json on every change, so size + mtime is enough
+    # to tell whether anything changed without reading the whole file
+    stat = os.stat(DB_PATH)
+    return hashlib.md5(f"{stat.st_size}-{stat.st_mtime_ns}".encode()).hexdigest()
+
+def cached():
+    # Compared before the DB is read, so a 304 costs one stat() and nothing more
+    etag = db_etag()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return etag, response
+    return etag, None
+
+def conditional(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    return response
+
+def summarize_partner(partner):
+    files = partner.get("files", [])
+    anonymized = sum(1 for f in files if f.get("anonymized"))
+    return {
+        "id": partner.doc_id,
+        "partner": partner["partner"],
+        "icon": partner.get("icon"),
+        "files": len(files),
+        "anonymized": anonymized,
+        "deanonymized": len(files) - anonymized
+    }
+
 #===================================================================
 # INIT
 #==================================================================
 
 app = Flask(__name__)
 CORS(app)
-db = TinyDB('db.json')
-
-os.makedirs("static/icon", exist_ok=True)
-os.makedirs("static/upload", exist_ok=True)
-os.makedirs("temp", exist_ok=True)
+DB_PATH = 'db.json'
+dbLock = threading.Lock()
+vaultLock = threading.Lock()
+
+# Analysis worker processes (see analyzerPool) import this module too,
+# they only need the analyzer, not the databases or folders
+IS_WORKER = multiprocessing.parent_process() is not None
+if IS_WORKER:
+    db = vault = None
+else:
+    db = TinyDB(DB_PATH)
+    vault = TinyDB('vault.json')
+
+    os.makedirs("static/icon", exist_ok=True)
+    os.makedirs("static/upload", exist_ok=True)
+    os.makedirs("temp", exist_ok=True)
+    os.makedirs("temp/journal", exist_ok=True)
 
 globalHolder = {}
+CHUNK_ROWS = 5000
+
+# Free-text ("notes"/"remarks") columns
+FREETEXT_SAMPLE = 200
+FREETEXT_MIN_WORDS = 5
+FREETEXT_MAX_COVERAGE = 0.6
+FREETEXT_BATCH = 64
+# Measured: a warm pool adds ~0.1 s per call, a cell takes ~1.4 ms in-process,
+# so two workers only pay off from a few hundred distinct cells
+FREETEXT_PARALLEL_MIN = 500
+FREETEXT_PROCESSES = max(2, (os.cpu_count() or 2) // 2)
+# Each worker keeps its own spaCy model loaded for as long as the pool lives.
+# The pool only starts when MEMORY_BUDGET has room for at least two workers
+# next to the running job, so with 2 GB it stays off: raise the budget by
+# FREETEXT_PROCESSES * FREETEXT_WORKER_MEMORY to use it
+FREETEXT_WORKER_MEMORY = 1024 * 1024 * 1024
+
+# Admission control for heavy endpoints
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+MAX_TABLE_ROWS = 1_000_000
+MAX_HEAVY_JOBS = 4
+MAX_PARTNER_JOBS = 2
+MEMORY_BUDGET = 2 * 1024 * 1024 * 1024
+# Rough in-memory size / file size, per type
+COST_FACTOR = {".txt": 40, ".csv": 10, ".xls": 30, ".xlsx": 30}
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+
+# Bulk ingest
+UPLOAD_TYPES = {".txt", ".csv", ".xls", ".xlsx"}
+MAX_BULK_FILES = 500
+MAX_BULK_BYTES = 500 * 1024 * 1024
+# Batches not sent to /process within this many seconds are dropped
+BATCH_TTL = 60 * 60
+batchHolder = {}
+
+#==================================================================
+# Metrics
+#==================================================================
+
+metricsLock = threading.Lock()
+stageMetrics = defaultdict(lambda: {"count": 0, "seconds": 0.0, "rows": 0, "bytes": 0, "peak": 0})
+requestMetrics = defaultdict(lambda: {"count": 0, "seconds": 0.0})
+jobMetrics = OrderedDict()
+MAX_JOBS = 200
+# tracemalloc is process wide, so only one request is profiled at a time
+profileLock = threading.Lock()
+
+jobContext = threading.local()
+
+def currentJob():
+    # Bulk ingest workers (processes, or one thread) have no request context, they set jobContext
+    if has_request_context():
+        return g.get("job_id")
+    return getattr(jobContext, "job_id", None)
+
+@contextmanager
+def stage(name, rows=0, nbytes=0):
+    # Caller may fill in rows/bytes once known: with stage(...) as s: s["rows"] = n
+    # Peak memory only for stages of the profiled request itself. It is
+    # approximate: allocations of other requests running meanwhile count too
+    info = {"rows": rows, "bytes": nbytes}
+    tracing = has_request_context() and g.get("profile", False)
+    if tracing:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if tracing else 0
+        job = currentJob()
+        with metricsLock:
+            m = stageMetrics[name]
+            m["count"] += 1
+            m["seconds"] += seconds
+            m["rows"] += info["rows"]
+            m["bytes"] += info["bytes"]
+            m["peak"] = max(m["peak"], peak)
+            if job:
+                jobMetrics.setdefault(job, []).append({
+                    "stage": name,
+                    "seconds": round(seconds, 6),
+                    "rows": info["rows"],
+                    "bytes": info["bytes"],
+                    "peak": peak
+                })
+                jobMetrics.move_to_end(job)
+                while len(jobMetrics) > MAX_JOBS:
+                    jobMetrics.popitem(last=False)
+
+@app.before_request
+def startRequest():
+    # ?profile=1 or X-Profile: 1 turns on tracemalloc for this request,
+    # unless another profiled request is running (it then runs unprofiled)
+    g.job_id = uuid.uuid4().hex
+    g.start = time.perf_counter()
+    g.profile = (
+        (request.args.get("profile") == "1" or request.headers.get("X-Profile") == "1")
+        and profileLock.acquire(blocking=False)
+    )
+    if g.profile:
+        tracemalloc.start()
+
+@app.after_request
+def endRequest(response):
+    with metricsLock:
+        m = requestMetrics[(request.endpoint or "unknown", response.status_code)]
+        m["count"] += 1
+        m["seconds"] += time.perf_counter() - g.start
+    response.headers["X-Job-Id"] = g.job_id
+    if g.profile:
+        response.headers["X-Profiled"] = "1"
+    return response
+
+@app.teardown_request
+def stopProfiling(exc):
+    if g.get("profile"):
+        tracemalloc.stop()
+        profileLock.release()
+
+#==================================================================
+# File IO
+#==================================================================
+
+def readText(path):
+    with stage("read_text", nbytes=os.path.getsize(path)):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+def writeText(path, text):
+    with stage("write_text", nbytes=len(text)):
+        with open(path, "w", encoding="utf-8") as outFile:
+            outFile.write(text)
+
+def loadTable(path, password=None):
+    ext = os.path.splitext(path)[1].lower()
+    size = os.path.getsize(path)
+
+    if ext in {".xls", ".xlsx"}:
+        with open(path, "rb") as f:
+            office_file = msoffcrypto.OfficeFile(f)
+
+            if office_file.is_encrypted():
+                with stage("decrypt_office", nbytes=size):
+                    office_file.load_key(password=password)
+                    decrypted = io.BytesIO()
+                    office_file.decrypt(decrypted)
+                with stage("read_table", nbytes=size) as s:
+                    df = pd.read_excel(decrypted, engine="openpyxl")
+                    s["rows"] = len(df)
+                return df
+
+    with stage("read_table", nbytes=size) as s:
+        df = pd.read_excel(path) if ext in {".xls", ".xlsx"} else pd.read_csv(path)
+        s["rows"] = len(df)
+    return df
+
+def saveTable(df, path):
+    ext = os.path.splitext(path)[1].lower()
+    with stage("write_table", rows=len(df)) as s:
+        if ext in {".xls", ".xlsx"}:
+            df.to_excel(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+        s["bytes"] = os.path.getsize(path)
+
+def writeJson(path, obj):
+    # Write then rename, so the file is never half written
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, default=str)
+    os.replace(tmp, path)
+
+def inputPath(job):
+    # Uploads wait in temp/, bulk uploads in their batch folder
+    return job.get("path", os.path.join("temp", job["filename"]))
+
+def batchFolder(batch_id):
+    return os.path.join("temp", batch_id)
+
+def journalPath(partner, filename):
+    return os.path.join("temp", "journal", secure_filename(f"{partner}_{filename}"))
+
+def journalInput(folder, filename):
+    return os.path.join(folder, "input" + os.path.splitext(filename)[1].lower())
+
+def readJournal(folder):
+    path = os.path.join(folder, "journal.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        journal = json.load(f)
+    with open(os.path.join(folder, "data.json"), "r", encoding="utf-8") as f:
+        journal["data"] = json.load(f)
+    return journal
+
+def startJournal(folder, data):
+    # The job (review, spans) is written once, journal.json only tracks progress
+    writeJson(os.path.join(folder, "data.json"), data)
+    journal = {"chunk_rows": CHUNK_ROWS, "done": []}
+    writeJournal(folder, journal)
+    journal["data"] = data
+    return journal
+
+def writeJournal(folder, journal):
+    writeJson(
+        os.path.join(folder, "journal.json"),
+        {k: v for k, v in journal.items() if k != "data"}
+    )
+
+# TinyDB shares one file handle and isn't thread safe, every db access
+# (threaded requests, bulk ingest) goes through these helpers
+
+def findPartner(name):
+    with dbLock:
+        Partner = Query()
+        return db.search(Partner.partner == name)[0]
+
+def getPartner(name):
+    # None when there is no such partner
+    with dbLock:
+        Partner = Query()
+        return db.get(Partner.partner == name)
+
+def allPartners():
+    with dbLock:
+        return db.all()
+
+def insertPartner(profile):
+    with dbLock:
+        return db.insert(profile)
+
+def updateFiles(partner, files):
+    with stage("db_update"), dbLock:
+        db.update({"files": files}, doc_ids=[partner.doc_id])
+
+def appendFile(partner, file):
+    with stage("db_update"), dbLock:
+        db.update(
+            lambda record: record["files"].append(file),
+            doc_ids=[partner.doc_id]
+        )
+
+#==================================================================
+# Admission control
+#==================================================================
+
+governorLock = threading.Lock()
+running = {"jobs": 0, "cost": 0, "partners": Counter(), "seconds": 0.0, "finished": 0}
+poolLock = threading.Lock()
+pool = {"executor": None, "workers": 0}
+rejections = Counter()
+
+class Rejected(Exception):
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+def retryAfter():
+    # Average heavy job duration is a fair guess for when a slot frees up
+    if not running["finished"]:
+        return 5
+    return max(1, math.ceil(running["seconds"] / running["finished"]))
+
+def costOf(filename, size):
+    ext = os.path.splitext(filename)[1].lower()
+    return size * COST_FACTOR.get(ext, 10)
+
+def estimateCost(path):
+    if not os.path.exists(path):
+        return 0
+    return costOf(path, os.path.getsize(path))
+
+def countRows(path):
+    # Cheap pre-check for csv, other types are checked once loaded
+    if os.path.splitext(path)[1].lower() != ".csv":
+        return 0
+    rows = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            rows += block.count(b"\n")
+    return max(rows - 1, 0)
+
+def checkRows(rows):
+    if rows > MAX_TABLE_ROWS:
+        raise Rejected(413, f"Too many rows ({rows}), limit is {MAX_TABLE_ROWS}")
+
+def checkSlots(partner, cost):
+    # Caller holds governorLock. partner may be None when not known yet
+    try:
+        if cost > MEMORY_BUDGET:
+            raise Rejected(413, "File too large to process")
+        if partner is not None and running["partners"][partner] >= MAX_PARTNER_JOBS:
+            raise Rejected(429, "Too many jobs for this partner", retryAfter())
+        if running["jobs"] >= MAX_HEAVY_JOBS:
+            raise Rejected(503, "Server busy", retryAfter())
+        if running["jobs"] and running["cost"] + cost > MEMORY_BUDGET:
+            raise Rejected(503, "Not enough memory", retryAfter())
+    except Rejected as e:
+        rejections[e.status] += 1
+        raise
+
+def precheck(partner, size):
+    # Before the body is read: turn a request away without receiving the file.
+    # Cheapest type factor, so only requests that would surely fail are refused,
+    # admit() checks again with the real file
+    with governorLock:
+        checkSlots(partner, size * min(COST_FACTOR.values()))
+
+@contextmanager
+def admit(partner, cost):
+    with governorLock:
+        checkSlots(partner, cost)
+        running["jobs"] += 1
+        running["cost"] += cost
+        running["partners"][partner] += 1
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with governorLock:
+            running["jobs"] -= 1
+            running["cost"] -= cost
+            running["partners"][partner] -= 1
+            running["seconds"] += time.perf_counter() - start
+            running["finished"] += 1
+
+def warmAnalyzer():
+    # Pool initializer: the model loads on import, one call warms the pipeline
+    analyzer.analyze("Warm up", language="en")
+
+def analyzerPool():
+    # One long-lived spawn pool (forking the threaded server is unsafe), started
+    # on first use. Its memory stays reserved in the budget while it lives.
+    # None when the budget has no room for two workers, and inside a worker
+    if IS_WORKER:
+        return None
+    with poolLock:
+        if pool["executor"] is None:
+            with governorLock:
+                room = (MEMORY_BUDGET - running["cost"]) // FREETEXT_WORKER_MEMORY
+                workers = int(min(FREETEXT_PROCESSES, room))
+                if workers < 2:
+                    return None
+                running["cost"] += workers * FREETEXT_WORKER_MEMORY
+            pool["executor"] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warmAnalyzer
+            )
+            pool["workers"] = workers
+        return pool["executor"], pool["workers"]
+
+def dropPool(executor):
+    # A broken pool (worker killed, e.g. out of memory) is started again on next use
+    with poolLock:
+        if pool["executor"] is not executor:
+            return
+        pool["executor"] = None
+        with governorLock:
+            running["cost"] -= pool["workers"] * FREETEXT_WORKER_MEMORY
+        pool["workers"] = 0
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def rejected(e):
+    response = jsonify({ "error": e.message, "retry_after": e.retry_after })
+    response.status_code = e.status
+    if e.retry_after:
+        response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+#==================================================================
+# Tokenization (deterministic mode)
+#==================================================================
+
+def deriveKey(KEY, purpose):
+    # Tokens (HMAC) and vault entries (AES) each get their own key
+    return hmac.new(KEY, purpose, hashlib.sha256).digest()
+
+def tokenizer(KEY, cache):
+    # Same value -> same token, so each distinct value is hashed once per file
+    key = deriveKey(KEY, b"token")
+    def tokenize(value):
+        if value not in cache:
+            digest = hmac.new(key, value.encode("utf-8"), hashlib.sha256).hexdigest()
+            cache[value] = "TOK" + digest[:24]
+        return cache[value]
+    return tokenize
+
+def tokenOperator(KEY, cache):
+    # presidio calls a custom lambda with "PII" to validate it, so the operator
+    # only reads the cache. Values are cached from their spans beforehand
+    probe = tokenizer(KEY, {})
+    return OperatorConfig("custom", {"lambda": lambda value: cache.get(value) or probe(value)})
+
+def tokenId(token):
+    # A token ends in a hex digest, which doubles as its vault document id,
+    # so lookups are dict hits instead of queries over every record
+    try:
+        return int(token[3:], 16) if token.startswith("TOK") else None
+    except ValueError:
+        return None
+
+def saveVault(partner, KEY, cache):
+    # One record per token, only tokens not stored yet are encrypted and inserted
+    key = deriveKey(KEY, b"vault")
+    table = vault.table(partner["partner"])
+    with vaultLock:
+        stored = {d.doc_id for d in table.get(doc_ids=[tokenId(t) for t in cache.values()])}
+        new = [
+            Document({"token": token, "value": AESCipher.encrypt(key, value)}, doc_id=tokenId(token))
+            for value, token in cache.items() if tokenId(token) not in stored
+        ]
+        if new:
+            table.insert_multiple(new)
+
+def loadVault(partner, KEY, tokens):
+    key = deriveKey(KEY, b"vault")
+    table = vault.table(partner["partner"])
+    ids = {tokenId(t) for t in tokens} - {None}
+    with vaultLock:
+        found = table.get(doc_ids=list(ids))
+    return {d["token"]: AESCipher.decrypt(key, d["value"]) for d in found}
+
+def tokenizeTable(df, columns, freetext, tokenize):
+    # Every value the file will turn into a token, so the vault is saved once
+    # per file and before any chunk is written (a resumed job finds it complete)
+    for col in columns:
+        if col in df.columns:
+            mask = df[col].notna() & (df[col].astype(str).str.strip() != "")
+            for value in df.loc[mask, col].astype(str).unique():
+                tokenize(value)
+    for col, cells in freetext.items():
+        if col in df.columns:
+            for i in df.index:
+                text = str(df.at[i, col])
+                for start, end in cells.get(str(i), []):
+                    tokenize(text[start:end])
+
+def mapColumn(df, col, fn):
+    # Apply fn once per distinct non-empty value of the column
+    mask = df[col].notna() & (df[col].astype(str).str.strip() != "")
+    values = df.loc[mask, col].astype(str)
+    mapping = {v: fn(v) for v in values.unique()}
+    df[col] = df[col].astype(object)
+    df.loc[mask, col] = values.map(mapping)
+
+#==================================================================
+# Free-text columns
+#==================================================================
+
+def isFreeText(series):
+    # Prose columns: most cells are sentences rather than a single value
+    words = series.astype(str).head(FREETEXT_SAMPLE).str.split().str.len()
+    return words.median() >= FREETEXT_MIN_WORDS
+
+def keepSpans(results):
+    # Drop low-confidence and overlapping hits, earliest span wins
+    kept = []
+    for r in sorted(results, key=lambda r: (r.start, r.start - r.end)):
+        if int(r.score * 100) < 75:
+            continue
+        if kept and r.start < kept[-1].end:
+            continue
+        kept.append(r)
+    return kept
+
+def analyzeChunk(texts, entities):
+    # Plain tuples, so results can come back from a worker process
+    results = batchAnalyzer.analyze_iterator(
+        texts,
+        language="en",
+        batch_size=FREETEXT_BATCH,
+        entities=entities,
+        score_threshold=0.3
+    )
+    return [
+        [(r.entity_type, r.start, r.end, r.score) for r in keepSpans(result)]
+        for result in results
+    ]
+
+def analyzeParallel(texts, entities):
+    # Split over the analyzer pool, None when it can't be used
+    started = analyzerPool()
+    if started is None:
+        return None
+    executor, workers = started
+    size = math.ceil(len(texts) / workers)
+    chunks = [texts[i : i + size] for i in range(0, len(texts), size)]
+    try:
+        parts = executor.map(analyzeChunk, chunks, [entities] * len(chunks))
+        return [spans for part in parts for spans in part]
+    except BrokenProcessPool:
+        dropPool(executor)
+        return None
+
+def analyzeFreeText(series, partner):
+    # Each distinct cell is analyzed once, in batches (on the analyzer pool
+    # when there are enough of them and the pool is up)
+    texts = series.astype(str)
+    unique = texts.unique().tolist()
+
+    kept = None
+    if len(unique) >= FREETEXT_PARALLEL_MIN:
+        kept = analyzeParallel(unique, partner["detection"])
+    if kept is None:
+        kept = analyzeChunk(unique, partner["detection"])
+
+    found = {
+        text: [RecognizerResult(*span) for span in spans]
+        for text, spans in zip(unique, kept) if spans
+    }
+
+    # Compact per-cell spans: {row: [[start, end], ...]}
+    cells = {
+        str(i): [[r.start, r.end] for r in found[t]]
+        for i, t in texts.items() if t in found
+    }
+    return found, cells
+
+def encryptSpans(df, col, cells, operator):
+    # Encrypt only the spans inside each cell, returns their new positions
+    encrypted = {}
+    for i in df.index:
+        spans = cells.get(str(i))
+        if not spans:
+            continue
+        anonyResult = anonymizer.anonymize(
+            text=str(df.at[i, col]),
+            analyzer_results=[
+                RecognizerResult(entity_type="PERSON", start=start, end=end, score=1.0)
+                for start, end in spans
+            ],
+            operators={"DEFAULT" : operator}
+        )
+        df.at[i, col] = anonyResult.text
+        encrypted[str(i)] = sorted([item.start, item.end] for item in anonyResult.items)
+    return encrypted
+
+def spanTexts(df, col, cells):
+    return [
+        str(df.at[i, col])[start:end]
+        for i in df.index for start, end in cells.get(str(i), [])
+    ]
+
+def decryptSpans(df, col, cells, KEY, plain=None):
+    # plain: token -> value from the vault (deterministic mode)
+    rows = [i for i in df.index if cells.get(str(i))]
+
+    for i in rows:
+        value = str(df.at[i, col])
+        if plain is not None:
+            # Replace from the end so earlier spans stay valid
+            for start, end in reversed(cells[str(i)]):
+                value = value[:start] + plain.get(value[start:end], value[start:end]) + value[end:]
+        else:
+            value = denonymizer.deanonymize(
+                text=value,
+                entities=[
+                    OperatorResult(entity_type="PERSON", start=start, end=end,
+                                   text=value[start:end], operator="encrypt")
+                    for start, end in cells[str(i)]
+                ],
+                operators={"DEFAULT" : OperatorConfig ("decrypt", {"key": KEY})}
+            ).text
+        df.at[i, col] = value
+
+def spansPath(outpath):
+    return outpath + ".spans.json"
+
+def readSpans(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def writeSpans(path, spans):
+    writeJson(path, spans)
 
 #==================================================================
 # Analyze Function
 #==================================================================
 
-def analyzeTxt(job):
+def analyzeTxt(job, partner=None):
     #1) Open file to analyze
-    path = os.path.join("temp", job["filename"])
-    with open(path, "r", encoding="utf-8") as f:
-        TxtFile = f.read()
+    path = inputPath(job)
+    TxtFile = readText(path)
     
     #---------------------------------------------------------
-    # 2) Get partner detection list
-    Partner = Query()
-    partner = db.search(Partner.partner == job["partner"])[0]
+    # 2) Get partner detection list (bulk workers get it passed in, they have no db)
+    partner = partner or findPartner(job["partner"])
     
     # --------------------------------------------------------
     #3) Analyze
 
-    results = analyzer.analyze(
-            text=TxtFile,
-            language="en",
-            entities=partner["detection"],
-            score_threshold=0.3
-        )
+    with stage("analyze_nlp", nbytes=len(TxtFile)) as s:
+        results = analyzer.analyze(
+                text=TxtFile,
+                language="en",
+                entities=partner["detection"],
+                score_threshold=0.3
+            )
+        s["rows"] = TxtFile.count("\n") + 1
 
     #-----------------------------------------------------
     #4) Generate review report
@@ -200,37 +843,26 @@ def analyzeTxt(job):
         job["review"].append(new_review)
 
 
-def analyzeTable(job):
-    #0) Check partner from database
-    Partner = Query()
-    partner = db.search(Partner.partner == job["partner"])[0]
+def analyzeTable(job, partner=None):
+    #0) Check partner from database (bulk workers get it passed in, they have no db)
+    partner = partner or findPartner(job["partner"])
 
     #-----------------------------------------------------------------------
     #1) Open file to analyze
-    ext = os.path.splitext(job["filename"])[1].lower()
-    path = os.path.join("temp", job["filename"])
-
-    if ext in {".xls", ".xlsx"}:
-        with open(path, "rb") as f:
-            office_file = msoffcrypto.OfficeFile(f)
-
-            if office_file.is_encrypted():
-                office_file.load_key(password=partner["password"])
-                decrypted = io.BytesIO()
-                office_file.decrypt(decrypted)
-                df = pd.read_excel(decrypted, engine="openpyxl")
-            else:
-                df = pd.read_excel(path)
-    else:
-        df = pd.read_csv(path)
+    path = inputPath(job)
+    df = loadTable(path, partner["password"])
+    checkRows(len(df))
     
     #---------------------------------------------
     #2 Sample data for analysis
+    candidates = {}
 
     for col in df.columns:
         series = df[col][df[col].notna() & (df[col].astype(str).str.strip() != "")]
         if series.empty:
             continue
+        if isFreeText(series):
+            candidates[col] = series
 
         n = len(series)
         thirds = n // 3
@@ -255,30 +887,43 @@ def analyzeTable(job):
         job["review"].append({
             "column": col,
             "words": values,
-            "results":[]
+            "results":[],
+            "coverage":[]
         })
     
     #-------------------------------------------------------
     #4) Analyze
 
-    for data in job["review"]:
-        vals = data["words"]
-
-        for v in vals:
-            analyzeResult = analyzer.analyze(
-                text=str(v),
-                language="en",
-                entities=partner["detection"],
-                score_threshold=0.3
-            )
-
-            # May detect multiple entity we only take the highest score
-            if any(analyzeResult):
-                best = max(analyzeResult, key=lambda r: r.score)
-                data["results"].append({
-                    "entity": best.entity_type,
-                    "score": best.score,
-                })
+    with stage("analyze_nlp", rows=len(df)):
+        for data in job["review"]:
+            vals = data["words"]
+
+            for v in vals:
+                analyzeResult = analyzer.analyze(
+                    text=str(v),
+                    language="en",
+                    entities=partner["detection"],
+                    score_threshold=0.3
+                )
+
+                # May detect multiple entity we only take the highest score
+                if any(analyzeResult):
+                    best = max(analyzeResult, key=lambda r: r.score)
+                    data["results"].append({
+                        "entity": best.entity_type,
+                        "score": best.score,
+                    })
+                    data["coverage"].append((best.end - best.start) / max(len(str(v)), 1))
+
+    # Prose columns where PII (if any) covers only part of the cell
+    freetext = [
+        data["column"] for data in job["review"]
+        if data["column"] in candidates and (
+            not data["coverage"] or
+            sum(data["coverage"]) / len(data["coverage"]) < FREETEXT_MAX_COVERAGE
+        )
+    ]
+    job["review"] = [entry for entry in job["review"] if entry["column"] not in freetext]
 
     # Clean data. Remove none-PII column
     # Find majority entity and avg the score
@@ -297,6 +942,32 @@ def analyzeTable(job):
         entry["ignore"] = entry["confidence"] < 75
         if "results" in entry:
             del entry["results"]
+        if "coverage" in entry:
+            del entry["coverage"]
+
+    #-------------------------------------------------------
+    #5) Free-text columns: find spans in every cell
+    job["spans"] = {}
+    for col in freetext:
+        with stage("analyze_freetext", rows=len(candidates[col])):
+            found, cells = analyzeFreeText(candidates[col], partner)
+        if not found:
+            continue
+
+        hits = [r for kept in found.values() for r in kept]
+        majority_entity = Counter(r.entity_type for r in hits).most_common(1)[0][0]
+        matching_scores = [r.score for r in hits if r.entity_type == majority_entity]
+        entry = {
+            "column": col,
+            "mode": "freetext",
+            "words": [text[kept[0].start : kept[0].end] for text, kept in list(found.items())[:3]],
+            "entity": majority_entity.removeprefix("US_"),
+            "confidence": int(sum(matching_scores) / len(matching_scores) * 100),
+            "cells": len(cells)
+        }
+        entry["ignore"] = entry["confidence"] < 75
+        job["review"].append(entry)
+        job["spans"][col] = cells
 
 #==================================================================
 # Process Function
@@ -327,29 +998,39 @@ def processTxt(data):
 
     #------------------------------------------------------------
     # 2) Open the file to be encrypt
-    inpath = os.path.join("temp", data["filename"])
-    with open(inpath, "r", encoding="utf-8") as f:
-        TxtFile = f.read()
+    inpath = inputPath(data)
+    TxtFile = readText(inpath)
     
     #-----------------------------------------------------------
     #3) Get Encryption key for that partner in database
-    Partner = Query()
-    partner = db.search(Partner.partner == data["partner"])[0]
+    partner = findPartner(data["partner"])
     KEY = hashlib.sha256(partner["key"].encode()).digest()
 
     #-----------------------------------------------------------
-    #4) Encrypt...
-    anonyResult = anonymizer.anonymize(
-	    text=TxtFile, 
-	    analyzer_results=analyzeResult, 
-	    operators={"DEFAULT" : OperatorConfig ("encrypt", {"key": KEY})}
-    )
+    #4) Encrypt... (or tokenize when partner is deterministic)
+    if partner.get("deterministic"):
+        cache = {}
+        tokenize = tokenizer(KEY, cache)
+        for r in analyzeResult:
+            tokenize(TxtFile[r.start : r.end])
+        operator = tokenOperator(KEY, cache)
+    else:
+        operator = OperatorConfig("encrypt", {"key": KEY})
+
+    with stage("encrypt", rows=len(analyzeResult), nbytes=len(TxtFile)):
+        anonyResult = anonymizer.anonymize(
+            text=TxtFile, 
+            analyzer_results=analyzeResult, 
+            operators={"DEFAULT" : operator}
+        )
+
+    if partner.get("deterministic"):
+        saveVault(partner, KEY, cache)
 
     #---------------------------------------------------------
     # 5) Save encrypted data(same Filename) & delete old file
     outpath = os.path.join("static/upload", data["filename"])
-    with open(outpath, "w", encoding="utf-8") as outFile:
-        outFile.write(anonyResult.text)
+    writeText(outpath, anonyResult.text)
     os.remove(inpath)
 
     #--------------------------------------------------------------
@@ -375,16 +1056,62 @@ def processTxt(data):
         "original": original,
         "encrypt": encrypt
     }
-
-    db.update(
-        lambda record: record["files"].append(file),
-        doc_ids=[partner.doc_id]
-    )
+    appendFile(partner, file)
+
+def encryptChunk(df, target_columns, partner, KEY, freetext, cache):
+    # freetext: {column: {row: spans}}, returns the encrypted span positions
+    # cache: tokens of the whole file (deterministic mode), see tokenizeTable
+    if partner.get("deterministic"):
+        tokenize = tokenizer(KEY, cache)
+        operator = tokenOperator(KEY, cache)
+        for col in target_columns:
+            if col in df.columns:
+                mapColumn(df, col, tokenize)
+    else:
+        operator = OperatorConfig("encrypt", {"key": KEY})
+        for col in target_columns:
+            if col in df.columns:
+                for i, value in df[col].items():
+                    if pd.notna(value) and str(value).strip():
+                        value = str(value)
+                        anonyResult = anonymizer.anonymize(
+                            text=value, 
+                            analyzer_results= [RecognizerResult(
+                                                entity_type="PERSON",
+                                                start=0,end=len(value) - 1,
+                                                score=1.0
+                                                )],
+                            operators={"DEFAULT" : OperatorConfig ("encrypt", {"key": KEY})}
+                        )
+                        df.at[i, col] = anonyResult.text
+
+    return {
+        col: encryptSpans(df, col, cells, operator)
+        for col, cells in freetext.items() if col in df.columns
+    }
 
 def processTable(data):
+    #0) Resume from journal if a previous attempt was interrupted
+    folder = journalPath(data["partner"], data["filename"])
+    fresh = inputPath(data)
+    journal = readJournal(folder)
+    if journal is not None and os.path.exists(fresh):
+        # Same file uploaded again, the old attempt is stale
+        shutil.rmtree(folder, ignore_errors=True)
+        journal = None
+    resumed = journal is not None
+    inpath = journalInput(folder, data["filename"])
+
+    if resumed:
+        data = journal["data"]
+    else:
+        # Move input out of temp/ so nothing else can remove it mid-job
+        os.makedirs(folder, exist_ok=True)
+        os.replace(fresh, inpath)
+        journal = startJournal(folder, data)
+
     #3) Get key & password that partner in database
-    Partner = Query()
-    partner = db.search(Partner.partner == data["partner"])[0]
+    partner = findPartner(data["partner"])
     KEY = hashlib.sha256(partner["key"].encode()).digest()
 
     #-------------------------------------------------------------
@@ -396,55 +1123,64 @@ def processTable(data):
                 "column": entry["column"],
                 "detect": entry["entity"]
             })
-
-    #------------------------------------------------------------
-    # 2) Open the Tabular file to be encrypt
-    ext = os.path.splitext(data["filename"])[1].lower()
-    inpath = os.path.join("temp", data["filename"])
-
-    if ext in {".xls", ".xlsx"}:
-        with open(inpath, "rb") as f:
-            office_file = msoffcrypto.OfficeFile(f)
-
-            if office_file.is_encrypted():
-                office_file.load_key(password=partner["password"])
-                decrypted = io.BytesIO()
-                office_file.decrypt(decrypted)
-                df = pd.read_excel(decrypted, engine="openpyxl")
-            else:
-                df = pd.read_excel(inpath)
-    else:
-        df = pd.read_csv(inpath)
-
-
-    #-----------------------------------------------------------
-    #4) Encrypt columns
-    target_columns = [entry["column"] for entry in log]
-
-    for col in target_columns:
-        if col in df.columns:
-            for i, value in df[col].items():
-                if pd.notna(value) and str(value).strip():
-                    value = str(value)
-                    anonyResult = anonymizer.anonymize(
-                        text=value, 
-                        analyzer_results= [RecognizerResult(
-                                            entity_type="PERSON",
-                                            start=0,end=len(value) - 1,
-                                            score=1.0
-                                            )],
-                        operators={"DEFAULT" : OperatorConfig ("encrypt", {"key": KEY})}
-                    )
-                    df.at[i, col] = anonyResult.text
-    
-    #---------------------------------------------------------
-    # 5) Save encrypted data(same Filename) & delete old file
+            if entry.get("mode") == "freetext":
+                log[-1]["mode"] = "freetext"
     outpath = os.path.join("static/upload", data["filename"])
-    if ext in {".xls", ".xlsx"}:
-        df.to_excel(outpath, index=False)
-    else:
-        df.to_csv(outpath, index=False)
-    os.remove(inpath)
+    freetext = {
+        entry["column"]: data.get("spans", {}).get(entry["column"], {})
+        for entry in log if entry.get("mode") == "freetext"
+    }
+
+    if not journal.get("swapped"):
+        #------------------------------------------------------------
+        # 2) Open the Tabular file to be encrypt
+        df = loadTable(inpath, partner["password"])
+
+        #-----------------------------------------------------------
+        #4) Encrypt columns chunk by chunk, committing each to the journal
+        target_columns = [entry["column"] for entry in log if entry["column"] not in freetext]
+        cache = {}
+        if partner.get("deterministic"):
+            tokenizeTable(df, target_columns, freetext, tokenizer(KEY, cache))
+            saveVault(partner, KEY, cache)
+        chunk_rows = journal["chunk_rows"]
+        chunks = []
+        encrypted = {col: {} for col in freetext}
+
+        for k, begin in enumerate(range(0, len(df), chunk_rows)):
+            chunkpath = os.path.join(folder, f"chunk_{k}.pkl")
+            spanpath = os.path.join(folder, f"chunk_{k}.spans.json")
+            if k in journal["done"]:
+                chunks.append(pd.read_pickle(chunkpath))
+                if freetext:
+                    for col, cells in readSpans(spanpath).items():
+                        encrypted[col].update(cells)
+                continue
+
+            chunk = df.iloc[begin : begin + chunk_rows].copy()
+            with stage("encrypt", rows=len(chunk)):
+                chunkSpans = encryptChunk(chunk, target_columns, partner, KEY, freetext, cache)
+            chunk.to_pickle(chunkpath)
+            if freetext:
+                writeSpans(spanpath, chunkSpans)
+                for col, cells in chunkSpans.items():
+                    encrypted[col].update(cells)
+            journal["done"].append(k)
+            writeJournal(folder, journal)
+            chunks.append(chunk)
+
+        if chunks:
+            df = pd.concat(chunks)
+
+        #---------------------------------------------------------
+        # 5) Save encrypted data(same Filename), swap in only when complete
+        if freetext:
+            writeSpans(spansPath(outpath), {"original": freetext, "encrypt": encrypted})
+        partial = os.path.join("static/upload", ".partial_" + data["filename"])
+        saveTable(df, partial)
+        os.replace(partial, outpath)
+        journal["swapped"] = True
+        writeJournal(folder, journal)
 
     #--------------------------------------------------------------
     # 6) Update database
@@ -455,11 +1191,16 @@ def processTable(data):
         "download": outpath,
         "log": log,
     }
-
-    db.update(
-        lambda record: record["files"].append(file),
-        doc_ids=[partner.doc_id]
+    if freetext:
+        file["spans"] = spansPath(outpath)
+    # A crash right after the update would otherwise record the file twice
+    recorded = resumed and any(
+        f["filename"] == file["filename"] and f["download"] == outpath
+        for f in partner.get("files", [])
     )
+    if not recorded:
+        appendFile(partner, file)
+    shutil.rmtree(folder, ignore_errors=True)
     
 #=================================================================
 # Deanonymize
@@ -468,8 +1209,7 @@ def processTable(data):
 def deanonymizeTxt(data):
     #1) Open file that want to be decrypted
     path = data["file"]["download"]
-    with open(path, "r", encoding="utf-8") as f:
-        TxtFile = f.read()
+    TxtFile = readText(path)
     
     #----------------------------------------------------------
     #2) Manually generate OperatorResult for reversal
@@ -487,16 +1227,22 @@ def deanonymizeTxt(data):
     #-------------------------------------------------------------
     #3 Preceed to decrypt (de-anonymize)
     KEY = hashlib.sha256(data["partner"]["key"].encode()).digest()
-    deanonyResult = denonymizer.deanonymize(
-        text=TxtFile,
-        entities=reverse,
-        operators={"DEFAULT" : OperatorConfig ("decrypt", {"key": KEY})}
-    )
+    with stage("decrypt", rows=len(reverse), nbytes=len(TxtFile)):
+        if data["partner"].get("deterministic"):
+            # Tokens are looked up in the vault, replace from the end so spans stay valid
+            plain = loadVault(data["partner"], KEY, [r.text for r in reverse])
+            for r in sorted(reverse, key=lambda x: x.start, reverse=True):
+                TxtFile = TxtFile[:r.start] + plain.get(r.text, r.text) + TxtFile[r.end:]
+        else:
+            TxtFile = denonymizer.deanonymize(
+                text=TxtFile,
+                entities=reverse,
+                operators={"DEFAULT" : OperatorConfig ("decrypt", {"key": KEY})}
+            ).text
 
     #----------------------------------------------------------------------------
     #4 Override the file
-    with open(path, "w", encoding="utf-8") as outFile:
-        outFile.write(deanonyResult.text)
+    writeText(path, TxtFile)
     
     #--------------------------------------------------------------------------
     #5 Update database to say this file state change to de-anonymize
@@ -505,45 +1251,63 @@ def deanonymizeTxt(data):
         if f["filename"] == data["file"]["filename"]:
             files[idx]["anonymized"] = False
             break
-    db.update({"files": files}, doc_ids=[data["partner"].doc_id])
+    updateFiles(data["partner"], files)
 
 def deanonymizeTable(data):
     #1) Open file
     path = data["file"]["download"]
-
-    ext = os.path.splitext(data["file"]["filename"])[1].lower()
-    if ext in {".xls", ".xlsx"}:
-        df = pd.read_excel(path)
-    else:
-        df = pd.read_csv(path)
+    df = loadTable(path)
     
     #-------------------------------------------------------------
     #2 Preceed to decrypt (de-anonymize)
-    target_columns = [entry["column"] for entry in data["file"]["log"]]
+    log = data["file"]["log"]
+    target_columns = [entry["column"] for entry in log if entry.get("mode") != "freetext"]
+    freetext = [entry["column"] for entry in log if entry.get("mode") == "freetext"]
     KEY = hashlib.sha256(data["partner"]["key"].encode()).digest()
 
-    for col in target_columns:
-        if col in df.columns:
-            for i, value in df[col].items():
-                if pd.notna(value) and str(value).strip():
-                    value = str(value)
-                    deanonyResult = denonymizer.deanonymize(
-                        text=value,
-                        entities=[OperatorResult(
-                                        entity_type="PERSON",
-                                        start=0,end=len(value) - 1,
-                                        text=value,
-                                        operator="encrypt")],
-                        operators={"DEFAULT" : OperatorConfig ("decrypt", {"key": KEY})}
-                    )
-                    df.at[i, col] = deanonyResult.text
+    with stage("decrypt", rows=len(df)):
+        spans = readSpans(data["file"]["spans"])["encrypt"] if freetext else {}
+
+        plain = None
+        if data["partner"].get("deterministic"):
+            # One vault read for every column of the file
+            tokens = set()
+            for col in target_columns:
+                if col in df.columns:
+                    tokens.update(df[col].dropna().astype(str).unique())
+            for col in freetext:
+                if col in df.columns:
+                    tokens.update(spanTexts(df, col, spans.get(col, {})))
+            plain = loadVault(data["partner"], KEY, tokens)
+
+        for col in freetext:
+            if col in df.columns:
+                decryptSpans(df, col, spans.get(col, {}), KEY, plain)
+
+        if data["partner"].get("deterministic"):
+            for col in target_columns:
+                if col in df.columns:
+                    mapColumn(df, col, lambda t: plain.get(t, t))
+        else:
+            for col in target_columns:
+                if col in df.columns:
+                    for i, value in df[col].items():
+                        if pd.notna(value) and str(value).strip():
+                            value = str(value)
+                            deanonyResult = denonymizer.deanonymize(
+                                text=value,
+                                entities=[OperatorResult(
+                                                entity_type="PERSON",
+                                                start=0,end=len(value) - 1,
+                                                text=value,
+                                                operator="encrypt")],
+                                operators={"DEFAULT" : OperatorConfig ("decrypt", {"key": KEY})}
+                            )
+                            df.at[i, col] = deanonyResult.text
     
     #----------------------------------------------------------
     #3) Override the file
-    if ext in {".xls", ".xlsx"}:
-        df.to_excel(path, index=False)
-    else:
-        df.to_csv(path, index=False)
+    saveTable(df, path)
 
     #------------------------------------------------------------
     #4 Update database to say this file state change to de-anonymize
@@ -552,7 +1316,7 @@ def deanonymizeTable(data):
         if f["filename"] == data["file"]["filename"]:
             files[idx]["anonymized"] = False
             break
-    db.update({"files": files}, doc_ids=[data["partner"].doc_id]) 
+    updateFiles(data["partner"], files) 
 
 
 #=================================================================
@@ -562,8 +1326,7 @@ def deanonymizeTable(data):
 def anonymizeTxt(data):
     #1) Open file that want to be decrypted
     path = data["file"]["download"]
-    with open(path, "r", encoding="utf-8") as f:
-        TxtFile = f.read()
+    TxtFile = readText(path)
 
     #--------------------------------------------------------
     #2) Manually generate RecognizerResult for reversal
@@ -580,16 +1343,22 @@ def anonymizeTxt(data):
     #-------------------------------------------------------------
     #4 Preceed to encrypt (re-anonymize)
     KEY = hashlib.sha256(data["partner"]["key"].encode()).digest()
-    anonyResult = anonymizer.anonymize(
-        text=TxtFile, 
-        analyzer_results=analyzeResult, 
-        operators={"DEFAULT" : OperatorConfig ("encrypt", {"key": KEY})}
-    )
+    if data["partner"].get("deterministic"):
+        # Tokens are stable, so the vault already holds every value
+        operator = tokenOperator(KEY, {})
+    else:
+        operator = OperatorConfig("encrypt", {"key": KEY})
+
+    with stage("encrypt", rows=len(analyzeResult), nbytes=len(TxtFile)):
+        anonyResult = anonymizer.anonymize(
+            text=TxtFile, 
+            analyzer_results=analyzeResult, 
+            operators={"DEFAULT" : operator}
+        )
 
     #----------------------------------------------------------------------------
     #4 Override the file
-    with open(path, "w", encoding="utf-8") as outFile:
-        outFile.write(anonyResult.text)
+    writeText(path, anonyResult.text)
     
     #--------------------------------------------------------------------------
     #5 Update database to say this file state change to de-anonymize
@@ -598,45 +1367,54 @@ def anonymizeTxt(data):
         if f["filename"] == data["file"]["filename"]:
             files[idx]["anonymized"] = True
             break
-    db.update({"files": files}, doc_ids=[data["partner"].doc_id])
+    updateFiles(data["partner"], files)
 
 def anonymizeTable(data):
     #1) Open file
     path = data["file"]["download"]
-
-    ext = os.path.splitext(data["file"]["filename"])[1].lower()
-    if ext in {".xls", ".xlsx"}:
-        df = pd.read_excel(path)
-    else:
-        df = pd.read_csv(path)
+    df = loadTable(path)
     
     #-------------------------------------------------------------
     #2 Preceed to encrypt (re-anonymize)
-    target_columns = [entry["column"] for entry in data["file"]["log"]]
+    log = data["file"]["log"]
+    target_columns = [entry["column"] for entry in log if entry.get("mode") != "freetext"]
+    freetext = [entry["column"] for entry in log if entry.get("mode") == "freetext"]
     KEY = hashlib.sha256(data["partner"]["key"].encode()).digest()
 
-    for col in target_columns:
-        if col in df.columns:
-            for i, value in df[col].items():
-                if pd.notna(value) and str(value).strip():
-                    value = str(value)
-                    anonyResult = anonymizer.anonymize(
-                        text=value, 
-                        analyzer_results= [RecognizerResult(
-                                            entity_type="PERSON",
-                                            start=0,end=len(value) - 1,
-                                            score=1.0
-                                            )],
-                        operators={"DEFAULT" : OperatorConfig ("encrypt", {"key": KEY})}
-                    )
-                    df.at[i, col] = anonyResult.text
+    with stage("encrypt", rows=len(df)):
+        if data["partner"].get("deterministic"):
+            tokenize = tokenizer(KEY, {})
+            operator = tokenOperator(KEY, {})
+            for col in target_columns:
+                if col in df.columns:
+                    mapColumn(df, col, tokenize)
+        else:
+            operator = OperatorConfig("encrypt", {"key": KEY})
+            for col in target_columns:
+                if col in df.columns:
+                    for i, value in df[col].items():
+                        if pd.notna(value) and str(value).strip():
+                            value = str(value)
+                            anonyResult = anonymizer.anonymize(
+                                text=value, 
+                                analyzer_results= [RecognizerResult(
+                                                    entity_type="PERSON",
+                                                    start=0,end=len(value) - 1,
+                                                    score=1.0
+                                                    )],
+                                operators={"DEFAULT" : OperatorConfig ("encrypt", {"key": KEY})}
+                            )
+                            df.at[i, col] = anonyResult.text
+
+        if freetext:
+            spans = readSpans(data["file"]["spans"])
+            for col in freetext:
+                if col in df.columns:
+                    encryptSpans(df, col, spans["original"].get(col, {}), operator)
     
     #----------------------------------------------------------
     #3) Override the file
-    if ext in {".xls", ".xlsx"}:
-        df.to_excel(path, index=False)
-    else:
-        df.to_csv(path, index=False)
+    saveTable(df, path)
 
     #------------------------------------------------------------
     #4 Update database to say this file state change to de-anonymize
@@ -645,8 +1423,161 @@ def anonymizeTable(data):
         if f["filename"] == data["file"]["filename"]:
             files[idx]["anonymized"] = True
             break
-    db.update({"files": files}, doc_ids=[data["partner"].doc_id])  
+    updateFiles(data["partner"], files)  
+
+
+#==================================================================
+# Bulk ingest
+#==================================================================
+
+def streamSize(stream):
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+def analyzeFile(job, partner):
+    # Runs on the analyzer pool, one failing file doesn't fail the batch.
+    # Returns the job with its review, plain dicts only
+    jobContext.job_id = job["job_id"]
+    try:
+        checkRows(countRows(job["path"]))
+        if job["type"] == "Text File":
+            analyzeTxt(job, partner)
+        else:
+            analyzeTable(job, partner)
+    except Exception as e:
+        job["error"] = e.message if isinstance(e, Rejected) else str(e)
+        removeFile(job["path"])
+    finally:
+        jobContext.job_id = None
+    return job
+
+def removeFile(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+def expireBatches():
+    # Reviews that never came back, drop them with their files
+    now = time.time()
+    for batch_id, batch in list(batchHolder.items()):
+        if now - batch["created"] > BATCH_TTL:
+            batchHolder.pop(batch_id, None)
+            shutil.rmtree(batchFolder(batch_id), ignore_errors=True)
+
+def bulkIngest(partner, entries, batch_id):
+    # entries: (name, open stream) pairs. Each one is written to the batch
+    # folder here and analyzed on the analyzer pool (threads only share the
+    # GIL), so saving the next file overlaps with analyzing the previous ones.
+    # Without the pool, one thread analyzes them in turn
+    futures, errors, seen = [], [], set()
+    folder = batchFolder(batch_id)
+    os.makedirs(folder, exist_ok=True)
+
+    # Workers have no db, they get what analysis needs
+    record = findPartner(partner)
+    details = {
+        "partner": partner,
+        "detection": record["detection"],
+        "password": record["password"]
+    }
 
+    started = analyzerPool()
+    local = None if started else ThreadPoolExecutor(max_workers=1)
+    executor = started[0] if started else local
+    try:
+        for name, open_stream in entries:
+            filename = secure_filename(os.path.basename(name))
+            ext = os.path.splitext(filename)[1].lower()
+            if ext not in UPLOAD_TYPES:
+                errors.append({"filename": name, "error": "Unsupported file type"})
+                continue
+            if filename in seen:
+                errors.append({"filename": name, "error": "Duplicate filename"})
+                continue
+            seen.add(filename)
+
+            path = os.path.join(folder, filename)
+            try:
+                with stage("bulk_save") as s:
+                    with open_stream() as src, open(path, "wb") as out:
+                        shutil.copyfileobj(src, out, 1024 * 1024)
+                    s["bytes"] = os.path.getsize(path)
+            except RuntimeError:
+                # pyzipper: wrong password, or encrypted without one
+                errors.append({"filename": name, "error": "Wrong archive password"})
+                removeFile(path)
+                continue
+            except (pyzipper.BadZipFile, zlib.error, NotImplementedError, OSError) as e:
+                # Corrupt entry (bad CRC, truncated data) or unsupported compression
+                errors.append({"filename": name, "error": f"Unreadable entry: {e}"})
+                removeFile(path)
+                continue
+
+            job = {
+                "job_id": batch_id,
+                "partner": partner,
+                "filename": filename,
+                "path": path,
+                "type": "Text File" if ext == ".txt" else "Tabular File",
+                "review": []
+            }
+            futures.append((job, executor.submit(analyzeFile, job, details)))
+
+        jobs = []
+        for job, future in futures:
+            try:
+                job = future.result()
+            except BrokenProcessPool:
+                dropPool(executor)
+                job = dict(job, error="Analysis worker stopped")
+                removeFile(job["path"])
+            if "error" in job:
+                errors.append({"filename": job["filename"], "error": job["error"]})
+            else:
+                jobs.append(job)
+        return jobs, errors
+    finally:
+        if local:
+            local.shutdown()
+
+def processBatch(data):
+    expireBatches()
+    batch = batchHolder.get(data["batch_id"])
+    if batch is None:
+        return jsonify({ "error": "Unknown batch" }), 404
+
+    # Files run one after another, so the largest one sets the cost
+    cost = max(
+        [estimateCost(job["path"]) for job in batch["files"].values()],
+        default=0
+    )
+    with admit(batch["partner"], cost):
+        batchHolder.pop(data["batch_id"], None)
+        g.job_id = data["batch_id"]
+
+        processed, errors = [], []
+        for entry in data.get("files", []):
+            job = batch["files"].get(entry.get("filename"))
+            if job is None:
+                errors.append({"filename": entry.get("filename"), "error": "Not in batch"})
+                continue
+
+            job = dict(job, review=entry.get("review", []))
+            try:
+                if job["type"] == "Text File":
+                    processTxt(job)
+                else:
+                    processTable(job)
+                processed.append(job["filename"])
+            except Exception as e:
+                print("Error:", job["filename"], e)
+                errors.append({"filename": job["filename"], "error": "Server Error"})
+
+        # Files left out of the review are not kept (failed tables keep their journal)
+        shutil.rmtree(batchFolder(data["batch_id"]), ignore_errors=True)
+
+    return jsonify({ "msg": "Successfully processed", "processed": processed, "errors": errors }), 200
 
 #==================================================================
 # ROUTES
@@ -654,7 +1585,70 @@ def anonymizeTable(data):
 
 @app.route("/")
 def index():
-    return jsonify(db.all()), 200
+    return jsonify(allPartners()), 200
+
+@app.route("/partners")
+def partners():
+    try:
+        page = request.args.get("page", 1, type=int)
+        per_page = request.args.get("per_page", 20, type=int)
+        if page < 1 or per_page < 1:
+            return jsonify({ "error": "Bad Request" }), 400
+        per_page = min(per_page, 100)
+
+        etag, response = cached()
+        if response:
+            return response
+
+        records = allPartners()
+        start = (page - 1) * per_page
+        return conditional({
+            "page": page,
+            "per_page": per_page,
+            "total": len(records),
+            "partners": [summarize_partner(p) for p in records[start : start + per_page]]
+        }, etag)
+
+    except Exception as e:
+        print("Error:", e)
+        return jsonify({ "error": "Server Error" }), 500
+
+@app.route("/partners/<name>")
+def partner_detail(name):
+    try:
+        etag, response = cached()
+        if response:
+            return response
+
+        partner = getPartner(name)
+        if partner is None:
+            return jsonify({ "error": "Not Found" }), 404
+
+        # Secrets and span arrays are only needed server side, not the UI
+        detail = {k: v for k, v in partner.items() if k not in {"key", "password"}}
+        detail["id"] = partner.doc_id
+        detail["files"] = [
+            {k: v for k, v in f.items() if k not in {"original", "encrypt"}}
+            for f in partner.get("files", [])
+        ]
+        return conditional(detail, etag)
+
+    except Exception as e:
+        print("Error:", e)
+        return jsonify({ "error": "Server Error" }), 500
+
+@app.route("/partners/<name>/credentials")
+def partner_credentials(name):
+    # Only for the View Partner dialog, kept out of the cached endpoints
+    try:
+        partner = getPartner(name)
+        if partner is None:
+            return jsonify({ "error": "Not Found" }), 404
+        return jsonify({ "key": partner["key"], "password": partner["password"] }), 200
+
+    except Exception as e:
+        print("Error:", e)
+        return jsonify({ "error": "Server Error" }), 500
 
 @app.route("/create", methods=["POST"])
 def create():
@@ -684,10 +1678,13 @@ def create():
         path = os.path.join("static/icon", secure_filename(profile["partner"] + ext))
         iconFile.save(path)
         profile["icon"] = path
+
+        # Optional: same value always maps to the same token
+        profile["deterministic"] = request.form.get("deterministic", "").lower() in {"1", "true", "on"}
         
         #Update new partner in db
         profile["files"] = []
-        db.insert(profile)
+        insertPartner(profile)
         return  jsonify({ "message": "Succecssfuly created", "partner": profile["partner"] }), 200
     
     except Exception as e:
@@ -698,8 +1695,13 @@ def create():
 def upload():
     try:
         global globalHolder
+        # Slots are checked before request.form/files, which read the whole body
+        precheck(request.args.get("partner"), request.content_length or 0)
+
         partner = request.form.get("partner")
         file = request.files.get("file")
+        if request.args.get("partner", partner) != partner:
+            return "Bad Request", 400
 
         if (
             not partner or 
@@ -709,35 +1711,147 @@ def upload():
             return "Bad Request", 400
         
         ext = os.path.splitext(file.filename)[1].lower()
-        if ext not in {".txt", ".csv", ".xls", ".xlsx"}:
+        if ext not in UPLOAD_TYPES:
             return "Unsupported file type", 400
 
         filename = secure_filename(file.filename)
-        file.save(os.path.join("temp", filename))
+        path = os.path.join("temp", filename)
+        file.save(path)
 
         job = {
+            "job_id": g.job_id,
             "partner": partner,
             "filename": filename,
             "review": []
         }
 
-        if ext == ".txt":
-            job["type"] = "Text File"
-            analyzeTxt(job)
-        elif ext in {".csv", ".xls", ".xlsx"}:
-            job["type"] = "Tabular File"
-            analyzeTable(job)
+        try:
+            checkRows(countRows(path))
+            with admit(partner, estimateCost(path)):
+                if ext == ".txt":
+                    job["type"] = "Text File"
+                    analyzeTxt(job)
+                elif ext in {".csv", ".xls", ".xlsx"}:
+                    job["type"] = "Tabular File"
+                    analyzeTable(job)
+        except Rejected:
+            # Nothing is kept for a rejected upload, the client sends it again
+            os.remove(path)
+            raise
         
+        # Per-cell spans stay on the server for /process
+        spans = job.pop("spans", None)
         globalHolder = job.copy()
         del globalHolder["review"]
         print("=========Check global before=========")
         print(globalHolder)
+        if spans:
+            globalHolder["spans"] = spans
         return jsonify(job), 200
 
+    except Rejected as e:
+        return rejected(e)
+    except RequestEntityTooLarge:
+        return jsonify({ "error": "File too large" }), 413
     except Exception as e:
         print(e)
         return "Server Error", 500
 
+@app.route("/bulk-upload", methods=["POST"])
+def bulk_upload():
+    try:
+        request.max_content_length = MAX_BULK_BYTES
+        expireBatches()
+        # Slots are checked before request.form/files, which read the whole body
+        precheck(request.args.get("partner"), request.content_length or 0)
+
+        partner = request.form.get("partner")
+        files = [f for f in request.files.getlist("files") if f.filename.strip()]
+        archive = request.files.get("archive")
+        if request.args.get("partner", partner) != partner:
+            return jsonify({ "error": "Bad Request" }), 400
+
+        if not partner or not (files or archive):
+            return jsonify({ "error": "Bad Request" }), 400
+
+        record = getPartner(partner)
+        if record is None:
+            return jsonify({ "error": "Unknown partner" }), 404
+
+        #1) List entries without reading them yet
+        zf = None
+        if archive:
+            # Archives may be protected with the partner password, like /download
+            try:
+                zf = pyzipper.AESZipFile(archive.stream)
+            except pyzipper.BadZipFile:
+                return jsonify({ "error": "Unreadable archive" }), 400
+            zf.setpassword(record["password"].encode())
+            infos = [
+                i for i in zf.infolist()
+                if not i.is_dir() and not i.filename.startswith("__MACOSX/")
+            ]
+            entries = [(i.filename, (lambda i=i: zf.open(i))) for i in infos]
+            sizes = [(i.filename, i.file_size) for i in infos]
+        else:
+            entries = [(f.filename, (lambda f=f: f.stream)) for f in files]
+            sizes = [(f.filename, streamSize(f.stream)) for f in files]
+
+        batch_id = g.job_id
+        try:
+            if len(entries) > MAX_BULK_FILES:
+                return jsonify({ "error": f"Too many files, limit is {MAX_BULK_FILES}" }), 413
+            if sum(size for _, size in sizes) > MAX_BULK_BYTES:
+                return jsonify({ "error": "Files too large" }), 413
+
+            #2) Stream to disk and analyze in parallel
+            # At most one file per analyzer pool worker is in memory at once
+            costs = sorted((costOf(name, size) for name, size in sizes), reverse=True)
+            with admit(partner, sum(costs[:FREETEXT_PROCESSES])):
+                jobs, errors = bulkIngest(partner, entries, batch_id)
+        except Exception:
+            shutil.rmtree(batchFolder(batch_id), ignore_errors=True)
+            raise
+        finally:
+            if zf:
+                zf.close()
+
+        #3) Keep everything but the review for /process
+        if jobs:
+            batchHolder[batch_id] = {
+                "partner": partner,
+                "created": time.time(),
+                "files": {
+                    job["filename"]: {k: v for k, v in job.items() if k != "review"}
+                    for job in jobs
+                }
+            }
+        else:
+            shutil.rmtree(batchFolder(batch_id), ignore_errors=True)
+            if zf and errors and all(e["error"] == "Wrong archive password" for e in errors):
+                return jsonify({ "error": "Wrong archive password" }), 400
+        return jsonify({
+            "batch_id": batch_id,
+            "partner": partner,
+            "files": [
+                {
+                    "filename": job["filename"],
+                    "type": job["type"],
+                    "review": job["review"]
+                }
+                for job in jobs
+            ],
+            "errors": errors
+        }), 200
+
+    except Rejected as e:
+        return rejected(e)
+    except RequestEntityTooLarge:
+        return jsonify({ "error": "Files too large" }), 413
+    except Exception as e:
+        print("Error:", e)
+        return jsonify({ "error": "Server Error" }), 500
+
 @app.route("/process", methods=["POST"])
 def process():
     try:
@@ -746,22 +1860,78 @@ def process():
 
         if not data:
             return jsonify({ "error": "Bad Request" }), 400
+
+        # Consolidated review from /bulk-upload
+        if isinstance(data, dict) and "batch_id" in data:
+            return processBatch(data)
         
         print("=========Check global after=========")
-        pprint.pprint(globalHolder)
-        globalHolder["review"] = copy.deepcopy(data)
-        data = copy.deepcopy(globalHolder)
-        globalHolder = {}
-        print("=========Check review=========")
-        pprint.pprint(data)
-        
-        if data["type"] == "Text File":
-            processTxt(data)
-        elif data["type"] == "Tabular File":
-            processTable(data)
+        pprint.pprint({k: v for k, v in globalHolder.items() if k != "spans"})
+
+        if not globalHolder:
+            return jsonify({ "error": "Nothing to process" }), 400
+
+        # Admit before globalHolder is consumed, so a rejected call can be retried.
+        # A retried table job has its input in the journal folder
+        path = inputPath(globalHolder)
+        folder = journalPath(globalHolder["partner"], globalHolder["filename"])
+        cost = estimateCost(path) or estimateCost(journalInput(folder, globalHolder["filename"]))
+        with admit(globalHolder["partner"], cost):
+            globalHolder["review"] = copy.deepcopy(data)
+            data = copy.deepcopy(globalHolder)
+            pending = globalHolder
+            globalHolder = {}
+            # Report processing under the same job as its upload
+            g.job_id = data.get("job_id", g.job_id)
+            print("=========Check review=========")
+            pprint.pprint({k: v for k, v in data.items() if k != "spans"})
+
+            try:
+                if data["type"] == "Text File":
+                    processTxt(data)
+                elif data["type"] == "Tabular File":
+                    processTable(data)
+            except Exception:
+                # Hand the job back so /process can be retried, unless a new
+                # upload took its place. Tables then resume from the journal
+                if not globalHolder:
+                    globalHolder = pending
+                raise
          
         return jsonify({ "msg": "Successfully processed" }), 200
 
+    except Rejected as e:
+        return rejected(e)
+    except Exception as e:
+        print(e)
+        return jsonify({ "error": "Server Error" }), 500
+
+@app.route("/resume", methods=["POST"])
+def resume():
+    try:
+        meta = {
+            "partner":   request.form.get("partner"),
+            "filename":  request.form.get("filename"),
+        }
+        if not all(meta.values()):
+            return jsonify({ "error": "Bad Request" }), 400
+
+        folder = journalPath(meta["partner"], secure_filename(meta["filename"]))
+        journal = readJournal(folder)
+        if journal is None:
+            return jsonify({ "error": "No interrupted job" }), 404
+
+        # A new upload of the same file would make processTable drop the journal
+        if os.path.exists(inputPath(journal["data"])):
+            return jsonify({ "error": "Stale journal, the file was uploaded again. Process the new upload instead" }), 409
+
+        g.job_id = journal["data"].get("job_id", g.job_id)
+        with admit(meta["partner"], estimateCost(journalInput(folder, journal["data"]["filename"]))):
+            processTable(journal["data"])
+        return jsonify({ "msg": "Successfully processed" }), 200
+
+    except Rejected as e:
+        return rejected(e)
     except Exception as e:
         print(e)
         return jsonify({ "error": "Server Error" }), 500
@@ -777,8 +1947,7 @@ def deanony():
             return "Bad Request", 400
         
         #1) Get partner object, with that get file object from database
-        Partner = Query()
-        partner = db.search(Partner.partner == meta["partner"])[0]
+        partner = findPartner(meta["partner"])
 
         file = next((f for f in partner.get("files", []) if f.get("filename") == meta["filename"]), None)
             
@@ -786,13 +1955,16 @@ def deanony():
             "partner": partner,
             "file": file
         }
-        if file["type"] == "Text File":
-            deanonymizeTxt(data)
-        elif file["type"] == "Tabular File":
-            deanonymizeTable(data)
+        with admit(meta["partner"], estimateCost(file["download"])):
+            if file["type"] == "Text File":
+                deanonymizeTxt(data)
+            elif file["type"] == "Tabular File":
+                deanonymizeTable(data)
 
         return "OK", 200
 
+    except Rejected as e:
+        return rejected(e)
     except Exception as e:
         print("Error:", e)
         return "Server Error", 500
@@ -808,8 +1980,7 @@ def anony():
             return "Bad Request", 400
 
         #1) Get partner object, with that get file object from database
-        Partner = Query()
-        partner = db.search(Partner.partner == meta["partner"])[0]
+        partner = findPartner(meta["partner"])
 
         file = next((f for f in partner.get("files", []) if f.get("filename") == meta["filename"]), None)
 
@@ -817,13 +1988,16 @@ def anony():
             "partner": partner,
             "file": file
         }
-        if file["type"] == "Text File":
-            anonymizeTxt(data)
-        elif file["type"] == "Tabular File":
-            anonymizeTable(data)
+        with admit(meta["partner"], estimateCost(file["download"])):
+            if file["type"] == "Text File":
+                anonymizeTxt(data)
+            elif file["type"] == "Tabular File":
+                anonymizeTable(data)
 
         return "OK", 200
 
+    except Rejected as e:
+        return rejected(e)
     except Exception as e:
         print("Error:", e)
         return "Server Error", 500
@@ -835,19 +2009,21 @@ def download_zip():
         if not data:
             return "Bad Request", 400
 
-        Partner = Query()
-        partner = db.search(Partner.partner == data)[0]
+        partner = findPartner(data)
 
         files = [file["download"] for file in partner.get("files", [])]
         if not files:
             return "No files uploaded", 400
         
-        zip_buffer = io.BytesIO()
-        with pyzipper.AESZipFile(zip_buffer, 'w', compression=pyzipper.ZIP_DEFLATED, encryption=pyzipper.WZ_AES) as zf:
-            zf.setpassword(partner["password"].encode())
-            for path in files:
-                arcname = os.path.basename(path)
-                zf.write(path, arcname=arcname)
+        # The archive is built in memory, at most about the size of its files
+        size = sum(os.path.getsize(p) for p in files)
+        with admit(data, size), stage("zip", rows=len(files), nbytes=size):
+            zip_buffer = io.BytesIO()
+            with pyzipper.AESZipFile(zip_buffer, 'w', compression=pyzipper.ZIP_DEFLATED, encryption=pyzipper.WZ_AES) as zf:
+                zf.setpassword(partner["password"].encode())
+                for path in files:
+                    arcname = os.path.basename(path)
+                    zf.write(path, arcname=arcname)
 
         zip_buffer.seek(0)
         return send_file(
@@ -857,12 +2033,77 @@ def download_zip():
             download_name=f"{partner['partner']}.zip"
         ), 200
     
+    except Rejected as e:
+        return rejected(e)
     except Exception as e:
         print("Error:", e)
         return "Server Error", 500
 
+@app.route("/metrics")
+def metrics():
+    # Prometheus text exposition format, one contiguous group per metric
+    with metricsLock:
+        stages = sorted(copy.deepcopy(stageMetrics).items())
+        endpoints = sorted(copy.deepcopy(requestMetrics).items())
+    with governorLock:
+        rejected = sorted(rejections.items())
+        jobs, cost = running["jobs"], running["cost"]
+
+    lines = []
+    def header(name, kind, text):
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    header("dpp_stage_seconds", "summary", "Time spent per processing stage")
+    for name, m in stages:
+        lines.append(f'dpp_stage_seconds_count{{stage="{name}"}} {m["count"]}')
+        lines.append(f'dpp_stage_seconds_sum{{stage="{name}"}} {m["seconds"]:.6f}')
+
+    header("dpp_stage_rows_total", "counter", "Rows/spans handled per stage")
+    for name, m in stages:
+        lines.append(f'dpp_stage_rows_total{{stage="{name}"}} {m["rows"]}')
+
+    header("dpp_stage_bytes_total", "counter", "Bytes handled per stage")
+    for name, m in stages:
+        lines.append(f'dpp_stage_bytes_total{{stage="{name}"}} {m["bytes"]}')
+
+    header("dpp_stage_peak_memory_bytes", "gauge",
+           "Highest tracemalloc peak seen in a profiled stage (approximate)")
+    for name, m in stages:
+        lines.append(f'dpp_stage_peak_memory_bytes{{stage="{name}"}} {m["peak"]}')
+
+    header("dpp_request_seconds", "summary", "Request latency per endpoint and status")
+    for (endpoint, status), m in endpoints:
+        label = f'{{endpoint="{endpoint}",status="{status}"}}'
+        lines.append(f"dpp_request_seconds_count{label} {m['count']}")
+        lines.append(f"dpp_request_seconds_sum{label} {m['seconds']:.6f}")
+
+    header("dpp_admission_rejected_total", "counter", "Heavy requests turned away by admission control")
+    for status, count in rejected:
+        lines.append(f'dpp_admission_rejected_total{{status="{status}"}} {count}')
+
+    header("dpp_running_jobs", "gauge", "Heavy jobs currently admitted")
+    lines.append(f"dpp_running_jobs {jobs}")
+
+    header("dpp_running_cost_bytes", "gauge", "Estimated memory of admitted jobs")
+    lines.append(f"dpp_running_cost_bytes {cost}")
+
+    return "\n".join(lines) + "\n", 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+@app.route("/metrics/jobs/<job_id>")
+def job_metrics(job_id):
+    with metricsLock:
+        stages = copy.deepcopy(jobMetrics.get(job_id))
+    if stages is None:
+        return jsonify({ "error": "Not Found" }), 404
+    return jsonify({ "job_id": job_id, "stages": stages }), 200
+
 
 #=================================================================
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # PORT and FLASK_DEBUG=0 let scripts (loadtest.py) run the server as a plain subprocess
+    app.run(
+        debug=os.environ.get("FLASK_DEBUG", "1") != "0",
+        port=int(os.environ.get("PORT", 5000))
+    )
@@ -49,44 +49,62 @@ function App() {
   };
 
   // Function to fetch partners from the backend
+  // The list comes from /partners (summaries, no secrets), files and detection
+  // settings only for the selected partner, from /partners/<name>
   const fetchPartners = useCallback(async () => {
     setLoadingPartners(true);
     setError(null);
     try {
-      const response = await fetch(`${API_BASE_URL}/`);
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
+      const summaries = [];
+      for (let page = 1; ; page++) {
+        const response = await fetch(`${API_BASE_URL}/partners?page=${page}&per_page=100`);
+        if (!response.ok) {
+          throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const data = await response.json();
+        summaries.push(...data.partners);
+        if (data.partners.length === 0 || summaries.length >= data.total) {
+          break;
+        }
       }
-      const data = await response.json();
       // Map JSON structure to UI structure
-      const partnersWithFiles = data.map((partner) => {
-        const partnerId = partner.key || uuidv4();
-        return {
-          id: partnerId,
-          name: partner.partner,
-          logo: partner.icon ? (partner.icon.startsWith('/') ? partner.icon : '/' + partner.icon) : undefined,
-          detection_settings: partner.detection,
-          password: partner.password,
-          key: partner.key,
-          files: (partner.files || []).map((file, idx) => {
-            const fileId = file.id || uuidv4();
-            return {
-              id: fileId,
-              filename: file.filename,
-              type: file.type,
-              anonymized: file.anonymized,
-              state: file.anonymized ? 'Anonymized' : 'De-anonymized',
-              download: file.download,
-              log: file.log,
-            };
-          }),
-        };
-      });
-      setPartners(partnersWithFiles);
-      if (!selectedPartnerId && partnersWithFiles.length > 0) {
-        setSelectedPartnerId(partnersWithFiles[0].id);
-      } else if (selectedPartnerId && !partnersWithFiles.some((p) => p.id === selectedPartnerId)) {
-        setSelectedPartnerId(partnersWithFiles.length > 0 ? partnersWithFiles[0].id : null);
+      const partnersList = summaries.map((partner) => ({
+        id: partner.id,
+        name: partner.partner,
+        logo: partner.icon ? (partner.icon.startsWith('/') ? partner.icon : '/' + partner.icon) : undefined,
+        files: [],
+      }));
+
+      let selectedId = selectedPartnerId;
+      if (!selectedId || !partnersList.some((p) => p.id === selectedId)) {
+        selectedId = partnersList.length > 0 ? partnersList[0].id : null;
+      }
+
+      const selected = partnersList.find((p) => p.id === selectedId);
+      if (selected) {
+        const response = await fetch(`${API_BASE_URL}/partners/${encodeURIComponent(selected.name)}`);
+        if (!response.ok) {
+          throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const detail = await response.json();
+        selected.detection_settings = detail.detection;
+        selected.files = (detail.files || []).map((file) => {
+          const fileId = file.id || uuidv4();
+          return {
+            id: fileId,
+            filename: file.filename,
+            type: file.type,
+            anonymized: file.anonymized,
+            state: file.anonymized ? 'Anonymized' : 'De-anonymized',
+            download: file.download,
+            log: file.log,
+          };
+        });
+      }
+
+      setPartners(partnersList);
+      if (selectedId !== selectedPartnerId) {
+        setSelectedPartnerId(selectedId);
       }
     } catch (err) {
       console.error('Failed to fetch partners:', err);
@@ -149,7 +167,8 @@ function App() {
     formData.append('file', file);
 
     try {
-      const response = await fetch(`${API_BASE_URL}/upload`, {
+      // Partner also in the query string, so a busy server can refuse before the file is sent
+      const response = await fetch(`${API_BASE_URL}/upload?partner=${encodeURIComponent(selectedPartner.name)}`, {
         method: 'POST',
         body: formData,
       });
@@ -261,8 +280,22 @@ function App() {
   }
 
   // --- Handle opening ViewPartner modal ---
-  const handleViewPartnerDetails = () => {
-    setIsViewPartnerModalOpen(true);
+  // Key and password are only fetched when the dialog is opened
+  const handleViewPartnerDetails = async () => {
+    try {
+      const response = await fetch(`${API_BASE_URL}/partners/${encodeURIComponent(selectedPartner.name)}/credentials`);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const credentials = await response.json();
+      setPartners((prev) => prev.map((p) => (
+        p.id === selectedPartner.id ? { ...p, key: credentials.key, password: credentials.password } : p
+      )));
+      setIsViewPartnerModalOpen(true);
+    } catch (err) {
+      console.error('Failed to fetch partner credentials:', err);
+      alert(`Error loading partner details: ${err.message}`);
+    }
   };
 
   // --- Initial Loading State for Partners ---